@@ -0,0 +1,82 @@
+"""
+Chat benchmark: an N-turn session through ChatEngine against the stub provider,
+reporting per-turn latency and how the request size grows with the history.
+
+    python benchmarks/chat.py [--turns 50] [--budget 4000] [--ttft 0.02] [--json]
+
+Turns are sent one after another, as if each was typed once the previous reply
+finished; summaries are produced by the stub as well.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Long enough that the token budget starts folding turns within a few dozen turns
+PROMPT = "How do I find files larger than {n} MB under my home directory and sort them by size? " * 3
+
+
+async def run_session(turns: int, budget: int, ttft: float, token_delay: float) -> list:
+    from rich.console import Console
+    from helpers import chat_engine
+    from helpers.chat_history import ChatHistory
+    from helpers.llm import StubLLM
+
+    chat_engine.console = Console(file=io.StringIO())
+    llm = StubLLM(latency=ttft, tokens_per_second=1 / token_delay if token_delay > 0 else 0)
+    engine = chat_engine.ChatEngine(llm, ChatHistory(budget))
+    rows = []
+    for n in range(turns):
+        start = time.perf_counter()
+        await engine._respond(PROMPT.format(n=n))
+        rows.append({
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "prompt_tokens": engine.history.turns[-1].prompt_tokens,
+            "history_tokens": engine.history.tokens,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50, help="Messages in the session.")
+    parser.add_argument("--budget", type=int, default=4000, help="CHAT_TOKEN_BUDGET for the history.")
+    parser.add_argument("--ttft", type=float, default=0.02, help="Simulated time to first token (s).")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Simulated delay per token (s).")
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON.")
+    args = parser.parse_args()
+    # Keep the stub's turns out of the user's usage ledger
+    os.environ["AI_SHELL_USAGE_LEDGER"] = "false"
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows = asyncio.run(run_session(args.turns, args.budget, args.ttft, args.token_delay))
+
+    latencies = [r["latency_ms"] for r in rows]
+    results = {
+        "turns": args.turns,
+        "budget": args.budget,
+        "latency_median_ms": round(statistics.median(latencies), 2),
+        "latency_max_ms": round(max(latencies), 2),
+        "first_prompt_tokens": rows[0]["prompt_tokens"],
+        "last_prompt_tokens": rows[-1]["prompt_tokens"],
+        "max_prompt_tokens": max(r["prompt_tokens"] for r in rows),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for k, v in results.items():
+            print(f"{k:<20} {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Shell history benchmark: append_to_shell_history on a synthetic large history,
+compared with reading the whole file via readlines() as it used to.
+
+    python benchmarks/history.py [--lines 1000000] [--repeat 20] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# shell -> (path relative to HOME, line writer)
+FORMATS = {
+    "bash": (".bash_history", lambda i: f"echo command number {i}\n"),
+    "zsh": (".zsh_history", lambda i: f": {1700000000 + i}:0;echo command number {i}\n"),
+    "fish": (".local/share/fish/fish_history", lambda i: f"- cmd: echo command number {i}\n  when: {1700000000 + i}\n"),
+}
+
+
+def legacy_last_line(history_file: str) -> str:
+    """What append_to_shell_history used to do before writing."""
+    with open(history_file, "r", encoding="utf-8", errors="ignore") as f:
+        lines = f.readlines()
+    return lines[-1].strip() if lines else ""
+
+
+def write_history(path: Path, line, count: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, count, 10000):
+            f.write("".join(line(i) for i in range(start, min(start + 10000, count))))
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000, help="Entries in the synthetic history.")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per measurement; the median is reported.")
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        from helpers.shell_history import append_to_shell_history
+
+        for shell, (relative_path, line) in FORMATS.items():
+            os.environ["SHELL"] = f"/bin/{shell}"
+            history_file = Path(home) / relative_path
+            write_history(history_file, line, args.lines)
+            size = history_file.stat().st_size
+            # The command repeats the last entry, so nothing is written and runs stay comparable
+            last = f"echo command number {args.lines - 1}"
+            results.append({
+                "shell": shell,
+                "entries": args.lines,
+                "file_mb": round(size / 2**20, 1),
+                "readlines_ms": round(timed(lambda: legacy_last_line(str(history_file)), max(1, args.repeat // 5)), 3),
+                "append_ms": round(timed(lambda: append_to_shell_history(last), args.repeat), 3),
+                "unchanged": history_file.stat().st_size == size,
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            print(f"{r['shell']:<5} {r['entries']} entries ({r['file_mb']} MiB)  "
+                  f"readlines {r['readlines_ms']:9.3f} ms  tail-read append {r['append_ms']:7.3f} ms  "
+                  f"dedup {'ok' if r['unchanged'] else 'FAILED'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Prompt pipeline benchmark: time-to-command and time-to-menu for the serial
+script -> explanation flow versus the single pipelined request, and for the
+whole `ai prompt` run (_execute_prompt) with and without the explanation.
+
+    python benchmarks/pipeline.py [--ttft 0.4] [--token-delay 0.01] [--context-cache] [--json]
+
+Runs against the stub provider with a fixed time-to-first-token and per-token
+delay, so the numbers only reflect how the pipeline schedules round trips.
+With --context-cache the stub serves the prompts' system prefixes from cached
+contexts; the "stub" row shows how much of the input was read from them.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+def measure_serial(key: str, model: str) -> dict:
+    from helpers.completion import get_script_and_info, get_explanation
+    start = time.perf_counter()
+    script = get_script_and_info("list js files", key, model)
+    to_command = time.perf_counter() - start
+    "".join(get_explanation(script, key, model))
+    # The old flow printed the whole explanation before opening the menu
+    to_menu = time.perf_counter() - start
+    return {"time_to_command_ms": to_command * 1000, "time_to_menu_ms": to_menu * 1000}
+
+
+def measure_pipelined(key: str, model: str) -> dict:
+    from helpers.completion import get_script_with_explanation
+    start = time.perf_counter()
+    script, explanation = get_script_with_explanation("list js files", key, model)
+    to_command = time.perf_counter() - start
+    # The menu opens right away while the explanation streams in the background
+    to_menu = to_command
+    "".join(explanation)
+    done = time.perf_counter() - start
+    return {"time_to_command_ms": to_command * 1000, "time_to_menu_ms": to_menu * 1000,
+            "explanation_done_ms": done * 1000}
+
+
+def measure_execute_prompt(silent: bool) -> dict:
+    """The full `ai prompt` run; the menu is answered with Cancel as soon as it opens."""
+    import questionary
+    from rich.console import Console
+    from commands import prompt_command
+
+    opened = []
+
+    class Cancel:
+        def ask(self):
+            opened.append(time.perf_counter())
+            return "cancel"
+
+    select = questionary.select
+    questionary.select = lambda *args, **kwargs: Cancel()
+    prompt_command.console = Console(file=io.StringIO())
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            prompt_command._execute_prompt("list js files", silent_mode=silent)
+            done = time.perf_counter() - start
+    finally:
+        questionary.select = select
+    return {"time_to_menu_ms": (opened[0] - start) * 1000, "total_ms": done * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ttft", type=float, default=0.4, help="Simulated time to first token (s).")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Simulated delay per token (s).")
+    parser.add_argument("--context-cache", action="store_true", help="Turn on provider-side context caching.")
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON.")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "AI_SHELL_PROVIDER": "stub",
+        "AI_SHELL_SEMANTIC_THRESHOLD": "0",
+        # The prompt below is in the template library; measure the model path
+        "AI_SHELL_INTENT_THRESHOLD": "0",
+        "AI_SHELL_STUB_LATENCY": str(args.ttft),
+        "AI_SHELL_STUB_TOKENS_PER_SECOND": str(1 / args.token_delay if args.token_delay > 0 else 0),
+        "AI_SHELL_CONTEXT_CACHE": str(args.context_cache).lower(),
+    })
+    with tempfile.TemporaryDirectory() as home:
+        # Keep the user's config, caches and history out of it
+        os.environ["HOME"] = home
+        from helpers import cache
+        # Keep the cache out of the picture so every run does real round trips
+        cache._response_cache = cache.ResponseCache(Path(home) / "cache.db", ttl=0, max_entries=0)
+        key, model = "", "stub"
+
+        results = {
+            "serial": measure_serial(key, model),
+            "pipelined": measure_pipelined(key, model),
+            "execute_prompt": measure_execute_prompt(silent=False),
+            "execute_prompt_silent": measure_execute_prompt(silent=True),
+        }
+        # `ai prompt` uses the configured model, so it has a stub of its own
+        from helpers.llm import _llm_pool
+        results["stub"] = {
+            counter: sum(getattr(stub, counter) for stub in _llm_pool.values())
+            for counter in ("calls", "prefix_hits", "prompt_tokens", "cached_tokens")
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for mode, r in results.items():
+            print(f"{mode:<22} " + "  ".join(f"{k} {v:8.1f}" for k, v in r.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Rendering benchmark: throughput of strip_code_fences, the incremental
+CodeFenceStripper and read_stream_and_print on a large streamed output.
+
+    python benchmarks/render.py [--mb 5] [--chunk 4] [--json]
+
+Output goes to /dev/null, so this measures our own per-chunk overhead rather
+than the terminal's.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+LINE = "1. Searches the current directory recursively for files ending in .js.\n"
+
+
+def make_text(megabytes: float) -> str:
+    body = LINE * int(megabytes * 2**20 / len(LINE))
+    return f"```bash\n{body}```\n"
+
+
+def chunks(text: str, size: int):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+def throughput(fn, size: int) -> dict:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    return {"ms": round(elapsed * 1000, 1), "mb_per_s": round(size / 2**20 / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=5, help="Size of the streamed output.")
+    parser.add_argument("--chunk", type=int, default=4, help="Characters per streamed chunk (about one token).")
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON.")
+    args = parser.parse_args()
+
+    from helpers.completion import CodeFenceStripper, read_stream_and_print, strip_code_fences
+
+    text = make_text(args.mb)
+    size = len(text.encode("utf-8"))
+
+    def incremental():
+        stripper = CodeFenceStripper()
+        for chunk in chunks(text, args.chunk):
+            stripper.feed(chunk)
+        stripper.finish()
+
+    def render():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            read_stream_and_print(chunks(text, args.chunk))
+
+    results = {
+        "bytes": size,
+        "chunk_chars": args.chunk,
+        "strip_code_fences": throughput(lambda: strip_code_fences(text), size),
+        "code_fence_stripper": throughput(incremental, size),
+        "read_stream_and_print": throughput(render, size),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, r in results.items():
+            if isinstance(r, dict):
+                print(f"{name:<22} {r['ms']:>9.1f} ms  {r['mb_per_s']:>8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Runs the benchmark suites and writes one JSON document, to compare across commits.
+
+    python benchmarks/run.py [--suite startup --suite chat ...] [--quick] [--output results.json]
+
+Each suite is a script in this directory run in its own process with --json,
+against the offline stub provider where a model is involved.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HERE = Path(__file__).resolve().parent
+
+# suite -> (script, extra arguments for --quick)
+SUITES = {
+    "startup": ("startup.py", ["--repeat", "1"]),
+    "pipeline": ("pipeline.py", ["--ttft", "0.1", "--token-delay", "0.002"]),
+    "chat": ("chat.py", ["--turns", "20"]),
+    "render": ("render.py", ["--mb", "1"]),
+    "history": ("history.py", ["--lines", "100000", "--repeat", "5"]),
+}
+
+
+def git_commit() -> str:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return proc.stdout.strip() or "unknown"
+
+
+def run_suite(script: str, extra: list) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, str(HERE / script), "--json", *extra], cwd=ROOT, capture_output=True, text=True)
+    result = {"seconds": round(time.perf_counter() - start, 2), "exit_code": proc.returncode}
+    try:
+        result["results"] = json.loads(proc.stdout)
+    except json.JSONDecodeError:
+        result["error"] = (proc.stderr or proc.stdout).strip()[-2000:]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suite", action="append", choices=list(SUITES), help="Suite to run (repeatable). Default: all.")
+    parser.add_argument("--quick", action="store_true", help="Smaller inputs, for a fast smoke run.")
+    parser.add_argument("--output", help="Write the JSON here instead of stdout.")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": int(time.time()),
+        "quick": args.quick,
+        "suites": {},
+    }
+    for name in args.suite or SUITES:
+        script, quick_args = SUITES[name]
+        print(f"running {name}...", file=sys.stderr)
+        report["suites"][name] = run_suite(script, quick_args if args.quick else [])
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    sys.exit(1 if any(s["exit_code"] for s in report["suites"].values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Startup benchmark: runs each subcommand under `python -X importtime` and
+reports wall time, total import time and the slowest top-level imports.
+
+    python benchmarks/startup.py [--repeat N] [--json]
+
+Exits non-zero if a light command pulls in one of the heavy modules, so
+it can run in CI to catch lazy-import regressions.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# (label, argv, modules that must NOT be imported)
+HEAVY = ["llama_index", "questionary", "pyperclip", "google"]
+CASES = [
+    ("version", ["--version"], HEAVY),
+    ("help", ["--help"], HEAVY),
+    ("config get", ["config", "get", "MODEL"], HEAVY),
+    ("config help", ["config", "--help"], HEAVY),
+    ("chat help", ["chat", "--help"], []),
+    ("prompt help", ["prompt", "--help"], []),
+]
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """Parses `-X importtime` output into (module, self_us, cumulative_us)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Drop the single separator space; what remains encodes nesting depth.
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def run_case(argv: list[str], home: str) -> tuple[float, list[tuple[str, int, int]]]:
+    env = dict(os.environ, HOME=home, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", str(ROOT / "__main__.py"), *argv],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    return wall, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported.")
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest top-level imports to show.")
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON.")
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+    with tempfile.TemporaryDirectory() as home:
+        for label, argv, forbidden in CASES:
+            runs = [run_case(argv, home) for _ in range(args.repeat)]
+            wall, rows = min(runs, key=lambda r: r[0])
+            # Top-level entries are the ones without leading indentation.
+            top_level = [r for r in rows if not r[0].startswith(" ")]
+            loaded = {name.strip().split(".")[0] for name, _, _ in rows}
+            leaked = sorted(m for m in forbidden if m in loaded)
+            failed = failed or bool(leaked)
+            results.append({
+                "case": label,
+                "argv": argv,
+                "wall_ms": round(wall * 1000, 1),
+                "import_ms": round(sum(r[2] for r in top_level) / 1000, 1),
+                "modules": len(rows),
+                "slowest": [
+                    {"module": n.strip(), "cumulative_ms": round(c / 1000, 1)}
+                    for n, _, c in sorted(top_level, key=lambda r: -r[2])[:args.top]
+                ],
+                "forbidden_imports": leaked,
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            status = "FAIL " + ",".join(r["forbidden_imports"]) if r["forbidden_imports"] else "ok"
+            print(f"{r['case']:<14} wall {r['wall_ms']:>8.1f} ms  imports {r['import_ms']:>8.1f} ms  "
+                  f"({r['modules']} modules)  {status}")
+            for s in r["slowest"]:
+                print(f"    {s['cumulative_ms']:>8.1f} ms  {s['module']}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,79 @@
+# Imported first so the "startup" span covers the rest of the imports
+from helpers import tracing
+
+import importlib
 import typer
+from typer.core import TyperCommand, TyperGroup
 from typing_extensions import Annotated
-from typing import List
+from typing import List, Optional
 import sys
 
-# Import your command modules
-from commands import config_command, chat_command, update_command, prompt_command
 from helpers.error import handle_cli_error
 from helpers.constants import __version__
 
+# Subcommands are registered lazily: "name": ("module:typer_app", "help").
+# A command module (and heavy deps like llama-index) is only imported when
+# that subcommand is actually dispatched, so `ai --version` and
+# `ai config get` don't pay for the whole stack.
+LAZY_COMMANDS = {
+    "config": ("commands.config_command:config_app", "Configure the CLI settings."),
+    "chat": ("commands.chat_command:chat_app", "Start an interactive chat session."),
+    "prompt": ("commands.prompt_command:prompt_app", "Generate a shell command from a prompt."),
+    "batch": ("commands.batch_command:batch_app", "Translate a file of prompts into commands."),
+    "cache": ("commands.cache_command:cache_app", "Inspect or clear the response cache."),
+    "daemon": ("commands.daemon_command:daemon_app", "Manage the background daemon that keeps the model warm."),
+    "intents": ("commands.intents_command:intents_app", "Inspect the local template library and its hit rate."),
+    "stats": ("commands.stats_command:stats_app", "Show latency, token and cache statistics for model calls."),
+    # Assuming you have an update_command module
+    # "update": ("commands.update_command:update_app", "Update the AI Shell."),
+}
+
+
+class LazyCommand(TyperCommand):
+    """Placeholder for a subcommand whose Typer app is imported on first dispatch."""
+
+    def __init__(self, name: str, import_path: str, help: str):
+        super().__init__(name, help=help)
+        self.import_path = import_path
+        self._command = None
+
+    def load(self):
+        if self._command is None:
+            module_name, attr = self.import_path.split(":")
+            with tracing.span(f"import {module_name}"):
+                sub_app = getattr(importlib.import_module(module_name), attr)
+            if sub_app.registered_callback is None and len(sub_app.registered_commands) == 1 and not sub_app.registered_groups:
+                # A single-command app is a plain command, so options may follow its arguments
+                self._command = typer.main.get_command(sub_app)
+            else:
+                # Mount it the same way add_typer would have on the root app.
+                holder = typer.Typer(add_completion=False)
+                holder.add_typer(sub_app, name=self.name, help=self.help)
+                self._command = typer.main.get_command(holder).commands[self.name]
+        return self._command
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        # The returned context belongs to the real command, so the group
+        # invokes it directly from here on.
+        return self.load().make_context(info_name, args, parent=parent, **extra)
+
+
+class LazyGroup(TyperGroup):
+    """Root group that lists LAZY_COMMANDS without importing them."""
+
+    def __init__(self, **attrs):
+        super().__init__(**attrs)
+        for name, (import_path, help) in LAZY_COMMANDS.items():
+            self.commands.setdefault(name, LazyCommand(name, import_path, help))
+
+
 app = typer.Typer(
+    cls=LazyGroup,
     no_args_is_help=True,
     add_completion=False,
     help="A shell command-line interface powered by AI.",
 )
 
-# Register the specific subcommands that should be recognized
-app.add_typer(config_command.config_app, name="config", help="Configure the CLI settings.")
-app.add_typer(chat_command.chat_app, name="chat", help="Start an interactive chat session.")
-app.add_typer(prompt_command.prompt_app, name="prompt", help="Generate a shell command from a prompt.")
-# Assuming you have an update_command module
-# app.add_typer(update_command.update_app, name="update", help="Update the AI Shell.")
-
 def version_callback(value: bool):
     if value:
         print(f"AI Shell Version: {__version__}")
@@ -33,16 +86,30 @@ def main(
         bool,
         typer.Option("--version", callback=version_callback, is_eager=True, help="Show the version and exit."),
     ] = False,
+    no_daemon: Annotated[
+        bool,
+        typer.Option("--no-daemon", help="Talk to the model directly even if `ai daemon` is running."),
+    ] = False,
+    profile: Annotated[
+        bool,
+        typer.Option("--profile", help="Print a per-stage timing breakdown on exit."),
+    ] = False,
+    trace: Annotated[
+        Optional[str],
+        typer.Option("--trace", metavar="FILE", help="Write a Chrome trace (JSON) of the run to FILE. Implies --profile."),
+    ] = None,
 ):
     """
     AI Shell: A CLI powered by Google Gemini.
     Run 'ai prompt' to generate commands, or use 'config' and 'chat'.
     """
-    pass
+    if profile or trace:
+        tracing.enable(trace)
+    # Model calls are forwarded to the daemon when one is running (see helpers.llm)
+    if no_daemon:
+        from helpers.daemon import disable_daemon
+        disable_daemon()
 
 # This part is just to make the script runnable for testing, can be omitted if using an entrypoint
 if __name__ == "__main__":
     app()
-
-
-
@@ -0,0 +1,87 @@
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Iterator
+
+import typer
+from typing_extensions import Annotated
+
+from helpers.call_policy import collect_stats, get_call_policy, set_call_policy
+from helpers.completion import get_script_and_info
+from helpers.config import get_config
+from helpers.error import KnownError
+from helpers.i18n import _
+from helpers.llm import get_api_key
+
+batch_app = typer.Typer(
+    help="Translate a file of prompts into shell commands.",
+    add_completion=False,
+)
+
+def read_prompts(source: str) -> Iterator[str]:
+    """Yields prompts from a file (or stdin for '-'), one per line or as JSONL objects with a 'prompt' field."""
+    stream = sys.stdin if source == "-" else open(source, "r", encoding="utf-8")
+    try:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    line = json.loads(line)["prompt"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    raise KnownError(f"Invalid JSONL on line {line_number}: expected an object with a 'prompt' field")
+            yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def translate(prompt: str, key: str, model: str) -> dict:
+    start = time.perf_counter()
+    command, error = None, None
+    # Retries and backoff come from the shared call policy
+    with collect_stats() as stats:
+        try:
+            command = get_script_and_info(prompt=prompt, key=key, model=model)
+        except Exception as e:
+            error = str(e)
+    return {
+        "prompt": prompt,
+        "command": command,
+        "latency": round(time.perf_counter() - start, 3),
+        "retries": stats.retries,
+        "error": error,
+    }
+
+@batch_app.command(no_args_is_help=True)
+def main(
+    source: Annotated[str, typer.Argument(help="File of prompts, one per line or JSONL; '-' reads stdin.")],
+    concurrency: Annotated[int, typer.Option("--concurrency", "-c", min=1, help="Maximum requests in flight.")] = 4,
+    retries: Annotated[int, typer.Option("--retries", min=0, help="Retries per prompt on rate limits, 5xx errors and timeouts.")] = 3,
+):
+    """
+    Generates a command for every prompt and writes JSONL results to stdout, in input order.
+    """
+    config = get_config()
+    key = get_api_key(config)
+    model = config.get("MODEL", "gemini-1.5-flash")
+    set_call_policy(replace(get_call_policy(), retries=retries))
+
+    try:
+        prompts = list(read_prompts(source))
+    except OSError as e:
+        raise KnownError(f"{_('Error')}: {e}")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(translate, prompt, key, model) for prompt in prompts]
+        # Results are written as soon as every earlier one is done
+        for future in futures:
+            result = future.result()
+            failed += result["error"] is not None
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    if failed:
+        raise typer.Exit(code=1)
@@ -0,0 +1,36 @@
+import typer
+from rich.console import Console
+
+from helpers.cache import get_response_cache
+from helpers.i18n import _
+
+cache_app = typer.Typer(
+    help="Inspect or clear the local response cache.",
+    no_args_is_help=True,
+)
+console = Console()
+
+@cache_app.command("stats")
+def stats():
+    """
+    Shows cache size, entry counts and hit rate.
+    """
+    info = get_response_cache().stats()
+    lookups = info["hits"] + info["misses"]
+    hit_rate = f"{info['hits'] / lookups:.0%}" if lookups else "-"
+
+    console.print(f"[bold cyan]{_('Response cache')}[/bold cyan] [dim]{info['path']}[/dim]")
+    console.print(f"  {_('Entries')}: {sum(info['entries'].values())} / {info['max_entries']}")
+    for kind, count in sorted(info["entries"].items()):
+        console.print(f"    {kind}: {count}")
+    console.print(f"  {_('Size')}: {info['size_bytes'] / 1024:.1f} KiB")
+    console.print(f"  {_('Hits')}: {info['hits']}  {_('Misses')}: {info['misses']}  ({hit_rate})")
+    console.print(f"  TTL: {info['ttl']}s")
+
+@cache_app.command("clear")
+def clear():
+    """
+    Removes every cached response.
+    """
+    removed = get_response_cache().clear()
+    console.print(f"[green]✔ {_('Cache cleared')} ({removed}).[/green]")
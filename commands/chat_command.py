@@ -1,13 +1,17 @@
+import asyncio
+import time
 import typer
-import questionary
 from rich.console import Console
-from rich.spinner import Spinner
-from llama_index.llms.google_genai import GoogleGenAI
-from llama_index.core.llms import ChatMessage
+from rich.text import Text
+from typing import Optional
+from typing_extensions import Annotated
 
-from helpers.config import get_config
+from helpers.chat_history import ChatHistory
+from helpers.chat_sessions import ChatSession, list_sessions
+from helpers.config import get_config, DEFAULT_CONFIG
 from helpers.error import KnownError
 from helpers.i18n import _
+from helpers.llm import get_api_key, get_llm
 
 # This `invoke_without_command=True` is the critical fix
 chat_app = typer.Typer(
@@ -16,50 +20,63 @@ chat_app = typer.Typer(
 )
 console = Console()
 
+def print_sessions():
+    sessions = list_sessions()
+    if not sessions:
+        console.print(f"[dim]{_('No saved sessions')}[/dim]")
+        return
+    # One Text for the whole listing: printing line by line is slow with thousands of sessions
+    listing = Text()
+    records = _('records')
+    for session in sessions:
+        modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(session.modified))
+        listing.append(f"{session.name:<32} ")
+        listing.append(f"{modified}  {session.records} {records}\n", style="dim")
+    console.print(listing, end="")
+
 @chat_app.callback()
-def main():
+def main(
+    session: Annotated[
+        Optional[str],
+        typer.Option("--session", "-S", help="Save the conversation under this name, resuming it if it exists."),
+    ] = None,
+    list_: Annotated[
+        bool,
+        typer.Option("--list", help="List saved sessions and exit."),
+    ] = False,
+):
     """
     Starts an interactive chat session with the AI model.
     """
+    if list_:
+        print_sessions()
+        return
     try:
         config = get_config()
-        key = config.get("GOOGLE_API_KEY")
+        key = get_api_key(config)
         model = config.get("MODEL", "gemini-1.5-flash")
+        llm = get_llm(key, model)
 
-        if not key:
-            raise KnownError(_("Please set your Google Gemini API key via `ai config set GOOGLE_API_KEY=<your_token>`"))
-
-        llm = GoogleGenAI(model=model, api_key=key)
-        chat_history = []
+        token_budget = int(config.get("CHAT_TOKEN_BUDGET", DEFAULT_CONFIG["CHAT_TOKEN_BUDGET"]))
+        if session:
+            history = ChatSession(session).load(token_budget)
+        else:
+            history = ChatHistory(token_budget)
 
-        console.print(f"\n[bold cyan]{_('Starting new conversation')}[/bold cyan]")
+        if history.turns or history.summary:
+            console.print(f"\n[bold cyan]{_('Resuming conversation')} {session}[/bold cyan] [dim]({len(history.turns)} {_('recent messages')})[/dim]")
+        else:
+            console.print(f"\n[bold cyan]{_('Starting new conversation')}[/bold cyan]")
         console.print(_("send a message ('exit' to quit)"))
 
-        while True:
-            prompt = questionary.text(f"{_('You')}:").ask()
-
-            if not prompt or prompt.lower() == 'exit':
-                console.print(f"[yellow]{_('Goodbye!')}[/yellow]")
-                break
-            
-            chat_history.append(ChatMessage(role="user", content=prompt))
-
-            with console.status(Spinner("dots", text=f"[cyan]{_('THINKING...')}[/cyan]")):
-                response_stream = llm.stream_chat(chat_history)
-            
-            console.print("\n[bold green]AI Shell:[/bold green]")
-            
-            full_response = ""
-            for r in response_stream:
-                chunk = r.delta
-                print(chunk, end="", flush=True)
-                full_response += chunk
-            
-            print("\n") # Newline after response
-            chat_history.append(ChatMessage(role="assistant", content=full_response))
+        # Imported here so `ai chat --list` doesn't pay for the prompt UI
+        from helpers.chat_engine import ChatEngine
+        asyncio.run(ChatEngine(llm, history, model).run())
 
     except (KeyboardInterrupt):
         console.print(f"\n[yellow]{_('Goodbye!')}[/yellow]")
+    except KnownError:
+        raise
     except Exception as e:
         raise KnownError(f"A chat error occurred: {e}")
 
@@ -1,6 +1,5 @@
 import typer
 from rich.console import Console
-import questionary
 from typing_extensions import Annotated
 
 from helpers.config import get_config, set_configs, has_own, DEFAULT_CONFIG
@@ -63,6 +62,9 @@ def config_set(pairs: list[tuple[str, str]]):
 
 def run_config_ui():
     """An interactive UI for setting configuration."""
+    # Imported here so `ai config get/set` stays fast in scripts.
+    import questionary
+
     config = get_config()
 
     try:
@@ -0,0 +1,66 @@
+import typer
+from rich.console import Console
+
+from helpers.daemon import SOCKET_PATH, LOG_PATH, call_daemon, serve, start_daemon
+from helpers.error import KnownError
+from helpers.i18n import _
+
+daemon_app = typer.Typer(
+    help="Keep the model client warm in a background process.",
+    no_args_is_help=True,
+)
+console = Console()
+
+def _ping():
+    try:
+        return call_daemon("ping")
+    except (ConnectionError, OSError):
+        return None
+
+@daemon_app.command("start")
+def start():
+    """
+    Starts the daemon in the background. `ai prompt`, `chat` and `batch` use it automatically.
+    """
+    running = _ping()
+    if running:
+        console.print(f"[yellow]{_('Daemon already running')} (pid {running['pid']}).[/yellow]")
+        return
+    with console.status(f"[cyan]{_('Starting daemon...')}[/cyan]"):
+        reply = start_daemon()
+    if not reply:
+        raise KnownError(f"{_('Daemon failed to start')}, see {LOG_PATH}")
+    console.print(f"[green]✔ {_('Daemon started')} (pid {reply['pid']}).[/green]")
+
+@daemon_app.command("stop")
+def stop():
+    """
+    Stops the running daemon.
+    """
+    if not _ping():
+        console.print(f"[yellow]{_('Daemon is not running')}.[/yellow]")
+        return
+    call_daemon("shutdown")
+    console.print(f"[green]✔ {_('Daemon stopped')}.[/green]")
+
+@daemon_app.command("status")
+def status():
+    """
+    Shows whether the daemon is running.
+    """
+    reply = _ping()
+    if reply:
+        console.print(f"[green]{_('Daemon running')}[/green] (pid {reply['pid']}, v{reply['version']}) [dim]{SOCKET_PATH}[/dim]")
+    else:
+        console.print(f"[yellow]{_('Daemon is not running')}.[/yellow]")
+        raise typer.Exit(code=1)
+
+@daemon_app.command("run")
+def run():
+    """
+    Runs the daemon in the foreground (for service managers).
+    """
+    try:
+        serve()
+    except RuntimeError as e:
+        raise KnownError(str(e))
@@ -0,0 +1,64 @@
+import typer
+from rich.console import Console
+from rich.text import Text
+from typing_extensions import Annotated
+from typing import List
+
+from helpers.i18n import _
+from helpers.intents import USER_LIBRARY_PATH, get_intent_library, get_intent_threshold, load_stats
+from helpers.os_detect import detect_shell
+
+intents_app = typer.Typer(
+    help="Inspect the local library of command templates that answers common prompts without the model.",
+    no_args_is_help=True,
+)
+console = Console()
+
+@intents_app.command("stats")
+def stats(
+    misses: Annotated[int, typer.Option("--misses", "-m", help="How many of the most frequent misses to show.")] = 10,
+):
+    """
+    Shows how often prompts were answered from the library, and the prompts that weren't.
+    """
+    info = load_stats()
+    lookups = info["lookups"]
+    hit_rate = f"{info['hits'] / lookups:.0%}" if lookups else "-"
+
+    console.print(f"[bold cyan]{_('Template library')}[/bold cyan] [dim]{USER_LIBRARY_PATH}[/dim]")
+    console.print(f"  {_('Lookups')}: {lookups}  {_('Hits')}: {info['hits']}  ({hit_rate})")
+    for intent, count in sorted(info["intents"].items(), key=lambda item: -item[1]):
+        console.print(f"    {intent}: {count}")
+    if info["misses"] and misses > 0:
+        console.print(f"  {_('Most frequent misses')}:")
+        for prompt, count in sorted(info["misses"].items(), key=lambda item: -item[1])[:misses]:
+            console.print(f"    [dim]{count:>4}[/dim]  {prompt}")
+
+@intents_app.command("list")
+def list_intents():
+    """
+    Lists the templates for the current shell.
+    """
+    library = get_intent_library()
+    shell = detect_shell()
+    intents = set()
+    for pattern in library.data["patterns"]:
+        if library.supports(pattern["intent"], shell):
+            intents.add(pattern["intent"])
+            console.print(Text.assemble(f"{pattern['intent']:<28} ", (pattern["text"], "dim")))
+    console.print(f"[dim]{len(intents)} {_('intents')}, {shell}[/dim]")
+
+@intents_app.command("match")
+def match(
+    prompt_words: Annotated[List[str], typer.Argument(help="The prompt to look up.", show_default=False)],
+):
+    """
+    Shows which template a prompt would be answered with, for checking new templates.
+    """
+    prompt = " ".join(prompt_words)
+    found = get_intent_library().match(prompt, detect_shell(), get_intent_threshold())
+    if found is None:
+        console.print(f"[yellow]{_('No template matches; the model would be asked.')}[/yellow]")
+        return
+    console.print(f"[green]{found.intent}[/green] [dim]({found.score:.0%})[/dim]")
+    console.print(found.script, style="bold yellow", markup=False, highlight=False)
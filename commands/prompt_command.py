@@ -1,25 +1,37 @@
+import itertools
 import random
-import subprocess
+import threading
+from concurrent.futures import Future
 import typer
-import questionary
 import os
-from rich.console import Console
+from contextlib import nullcontext
+from rich.console import Console, Group
+from rich.live import Live
 from rich.panel import Panel
 from rich.text import Text
 from rich.spinner import Spinner
 from typing_extensions import Annotated
-from typing import List
+from typing import Callable, Generator, List, Optional, Tuple
 
-import pyperclip
 from helpers.config import get_config
 from helpers.constants import project_name
 from helpers.completion import (
-    get_script_and_info,
+    find_similar_script,
+    find_template_script,
+    get_script_candidates,
+    stream_script_and_info,
+    get_script_with_explanation,
     get_explanation,
-    get_revision,
+    stream_revision,
     read_stream_and_print,
 )
-from helpers.i18n import _, set_language
+from helpers.i18n import _, lazy_, set_language
+from helpers.llm import get_api_key
+from helpers.os_detect import detect_shell
+from helpers.script_checks import CheckedScript, rank_scripts
+from helpers.script_runner import RunResult, failure_prompt, run_streaming
+from helpers.semantic_index import Suggestion
+from helpers.tracing import span
 from helpers.shell_history import append_to_shell_history
 from helpers.error import KnownError
 
@@ -30,27 +42,160 @@ prompt_app = typer.Typer(
 )
 console = Console()
 
+# Translated when shown, after the configured language is set
 EXAMPLES = [
-    _("delete all log files"),
-    _("list js files"),
-    _("fetch me a random joke"),
-    _("list all commits"),
+    lazy_("delete all log files"),
+    lazy_("list js files"),
+    lazy_("fetch me a random joke"),
+    lazy_("list all commits"),
 ]
 
-def _execute_prompt(use_prompt: str = "", silent_mode: bool = False):
+class BackgroundExplanation:
+    """
+    Prints an explanation stream from a worker thread, so the run/revise menu
+    can open as soon as the script is known.
+    """
+
+    def __init__(self, stream: Generator[str, None, None]):
+        self._stream = stream
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _until_stopped(self) -> Generator[str, None, None]:
+        for chunk in self._stream:
+            if self._stopped.is_set():
+                return
+            yield chunk
+
+    def _run(self):
+        try:
+            with span("explanation"):
+                read_stream_and_print(self._until_stopped())
+        except KnownError as e:
+            console.print(f"[red]✖ {e}[/red]")
+        print("\n")
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def active(self) -> bool:
+        return self._thread.is_alive()
+
+    def stop(self):
+        """Stops printing (the rest of the stream is dropped) and waits briefly for the worker."""
+        self._stopped.set()
+        self._thread.join(timeout=0.5)
+
+class LiveScript:
+    """Shows a spinner until the first token arrives, then the script as it streams in."""
+
+    def __init__(self):
+        self._text = Text(style="bold yellow")
+        self._live = Live(
+            Spinner("dots", text=f"[cyan]{_('Loading...')}[/cyan]"),
+            console=console,
+            refresh_per_second=20,
+        )
+
+    def __enter__(self) -> "LiveScript":
+        self._live.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._live.update(self._render(), refresh=True)
+        self._live.__exit__(*exc_info)
+
+    def _render(self) -> Group:
+        return Group(Text(), self._text, Text())
+
+    def update(self, delta: str):
+        self._text.append(delta)
+        self._live.update(self._render())
+
+    @property
+    def script(self) -> str:
+        return self._text.plain
+
+def _generate_script(
+    the_prompt: str,
+    key: str,
+    model: str,
+    skip_explanation: bool,
+    on_script_delta: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, Optional[Generator[str, None, None]]]:
+    """Generates the script, and unless skipped, the explanation stream that follows it."""
+    if skip_explanation:
+        parts = []
+        for delta in stream_script_and_info(prompt=the_prompt, key=key, model=model):
+            parts.append(delta)
+            if on_script_delta is not None:
+                on_script_delta(delta)
+        return "".join(parts), None
+    # One request: the script arrives first, the explanation keeps streaming
+    return get_script_with_explanation(
+        prompt=the_prompt, key=key, model=model, on_script_delta=on_script_delta
+    )
+
+def _suggest_from_history(
+    suggestion: Suggestion,
+    the_prompt: str,
+    key: str,
+    model: str,
+    skip_explanation: bool,
+) -> Optional[Tuple[str, Optional[Generator[str, None, None]]]]:
+    """
+    Offers the command of a similar past prompt right away while a fresh one is generated
+    in the background. Returns the fresh result if the user waits for it, None otherwise.
+    """
+    import questionary
+
+    fresh: Future = Future()
+
+    def generate():
+        try:
+            fresh.set_result(_generate_script(the_prompt, key, model, skip_explanation))
+        except BaseException as e:
+            fresh.set_exception(e)
+
+    threading.Thread(target=generate, daemon=True).start()
+
+    console.print(Text.assemble(
+        "\n", (f"{_('Suggested from history')} ", "dim"),
+        (f"({suggestion.score:.0%} {_('similar to')} \"{suggestion.prompt}\")", "dim"), "\n\n",
+        (suggestion.command, "bold yellow"), "\n",
+    ))
+    with span("suggestion menu"):
+        choice = questionary.select(_("Use this suggestion?"), choices=[
+            questionary.Choice(title=f"⚡ {_('Use the suggested command')}", value="suggested"),
+            questionary.Choice(title=f"⏳ {_('Wait for a fresh answer')}", value="fresh"),
+        ]).ask()
+
+    if choice == "suggested":
+        run_or_revise_flow(suggestion.command, key, model, skip_explanation)
+        return None
+    if choice is None:
+        console.print(f"[yellow]{_('Goodbye!')}[/yellow]")
+        return None
+
+    with console.status(f"[cyan]{_('Loading...')}[/cyan]"), span("wait for fresh script"):
+        script, explanation_stream = fresh.result()
+    console.print(Group(Text(), Text(script, style="bold yellow"), Text()))
+    return script, explanation_stream
+
+def _execute_prompt(use_prompt: str = "", silent_mode: bool = False, candidates: int = 1):
     """
     The main prompt command logic. (Internal function)
     """
     try:
-        config = get_config()
-        set_language(config.get("LANGUAGE", "en"))
-        key = config.get("GOOGLE_API_KEY")
+        with span("get_config"):
+            config = get_config()
+        with span("set_language"):
+            set_language(config.get("LANGUAGE", "en"))
+        key = get_api_key(config)
         model = config.get("MODEL", "gemini-1.5-flash")
         skip_explanation = silent_mode or config.get("SILENT_MODE", False)
 
-        if not key:
-            raise KnownError(_("Please set your Google Gemini API key via `ai config set GOOGLE_API_KEY=<your_token>`"))
-
         console.print(Panel(f"[bold cyan]{project_name}[/bold cyan]", expand=False, border_style="dim"))
 
         the_prompt = use_prompt
@@ -58,20 +203,34 @@ def _execute_prompt(use_prompt: str = "", silent_mode: bool = False):
             console.print(f"[yellow]{_('Goodbye!')}[/yellow]")
             return
 
-        with console.status(f"[cyan]{_('Loading...')}[/cyan]") as status:
-            script = get_script_and_info(prompt=the_prompt, key=key, model=model)
-            status.update(f"[bold green]{_('Your script')}:[/bold green]")
-            console.print(f"\n[bold yellow]{script}[/bold yellow]\n")
-
+        if candidates > 1:
+            ranked = _generate_candidates(the_prompt, key, model, candidates)
+            script = ranked[0].script if ranked else ""
             if not skip_explanation and script:
-                status.update(f"[cyan]{_('Getting explanation...')}[/cyan]")
-                explanation_stream = get_explanation(script=script, key=key, model=model)
-                status.update(f"[bold green]{_('Explanation')}:[/bold green]")
-                print()
-                read_stream_and_print(explanation_stream)
-                print("\n")
-        
-        run_or_revise_flow(script, key, model, skip_explanation)
+                _explain(script, key, model)
+            run_or_revise_flow(script, key, model, skip_explanation, candidates=ranked)
+            return
+
+        suggestion = find_similar_script(the_prompt, model)
+        if suggestion is not None:
+            generated = _suggest_from_history(suggestion, the_prompt, key, model, skip_explanation)
+            if generated is None:
+                return
+            script, explanation_stream = generated
+        else:
+            with LiveScript() as live, span("generate script"):
+                script, explanation_stream = _generate_script(the_prompt, key, model, skip_explanation, live.update)
+            template = find_template_script(the_prompt)
+            if template is not None:
+                console.print(f"[dim]{_('From the template library')} ({template.intent})[/dim]")
+
+        explanation = None
+        if explanation_stream is not None and script:
+            console.print(f"[bold green]{_('Explanation')}:[/bold green]")
+            explanation = BackgroundExplanation(explanation_stream)
+            explanation.start()
+
+        run_or_revise_flow(script, key, model, skip_explanation, explanation)
 
     except (KeyboardInterrupt):
         console.print(f"\n[yellow]{_('Goodbye!')}[/yellow]")
@@ -90,27 +249,101 @@ def main(
         bool,
         typer.Option("--silent", "-s", help="Less verbose, skip printing the command explanation."),
     ] = False,
+    candidates: Annotated[
+        int,
+        typer.Option("--candidates", "-n", min=1, max=8, help="Generate this many commands in parallel and pick from them."),
+    ] = 1,
 ):
     """
     The entry point for the 'ai prompt' command.
     """
     if ctx.invoked_subcommand is None:
         prompt_text = " ".join(prompt_words) if prompt_words else ""
-        _execute_prompt(use_prompt=prompt_text, silent_mode=silent)
+        _execute_prompt(use_prompt=prompt_text, silent_mode=silent, candidates=candidates)
+
+
+def _explain(script: str, key: str, model: str):
+    """Prints the explanation of a script as it streams in."""
+    with console.status(f"[cyan]{_('Getting explanation...')}[/cyan]"):
+        explanation_stream = get_explanation(script=script, key=key, model=model)
+        # Wait for the first chunk here, so the spinner covers the time to first token
+        first_chunk = next(explanation_stream, "")
+    console.print(f"\n[bold green]{_('Explanation')}:[/bold green]")
+    markdown = get_config().get("MARKDOWN", False)
+    read_stream_and_print(itertools.chain([first_chunk], explanation_stream), markdown=markdown)
+    print("\n")
+
+def _candidate_issues(candidate: CheckedScript) -> List[str]:
+    issues = []
+    if candidate.syntax_error:
+        issues.append(_("syntax error"))
+    if candidate.missing_commands:
+        issues.append(f"{_('not found')}: {', '.join(candidate.missing_commands)}")
+    issues.extend(candidate.destructive)
+    return issues
 
+def _candidate_title(candidate: CheckedScript) -> str:
+    issues = _candidate_issues(candidate)
+    return f"{candidate.script}  ⚠ {'; '.join(issues)}" if issues else candidate.script
 
-def run_script(script: str):
+def _generate_candidates(the_prompt: str, key: str, model: str, count: int) -> List[CheckedScript]:
+    """Generates candidates concurrently and ranks them with local checks, best first."""
+    with console.status(f"[cyan]{_('Generating candidates...')}[/cyan]"), span("generate candidates", count=count):
+        scripts = get_script_candidates(the_prompt, key, model, count)
+    with span("rank candidates"):
+        ranked = rank_scripts(scripts, detect_shell())
+
+    console.print()
+    for i, candidate in enumerate(ranked, 1):
+        line = Text(f"{i}. ", style="dim")
+        line.append(candidate.script, style="bold yellow" if i == 1 else "yellow")
+        issues = _candidate_issues(candidate)
+        if issues:
+            line.append(f"  ⚠ {'; '.join(issues)}", style="red")
+        console.print(line)
+    console.print()
+    return ranked
+
+def run_script(script: str) -> Optional[RunResult]:
+    """Runs the script with its output streamed; the result keeps the tail of that output."""
     console.print(f"\n[dim]{_('Running')}: {script}[/dim]\n")
     try:
-        subprocess.run(script, shell=True, check=True, executable=os.environ.get("SHELL"))
-        append_to_shell_history(script)
-    except subprocess.CalledProcessError:
-        console.print("[red]✖ Script finished with a non-zero exit code.[/red]")
+        with span("run script"):
+            result = run_streaming(script, shell=os.environ.get("SHELL"))
     except Exception as e:
         console.print(f"[red]✖ Failed to run script: {e}[/red]")
+        return None
+    if result.failed:
+        console.print(f"[red]✖ {_('Script finished with a non-zero exit code.')} ({result.returncode})[/red]")
+    else:
+        append_to_shell_history(script)
+    return result
+
+def _offer_fix(result: Optional[RunResult]) -> bool:
+    """After a failed run, asks whether to send the error to the model for a fix."""
+    import questionary
+
+    if result is None or not result.failed:
+        return False
+    action = questionary.select(_("The script failed. Fix it?"), choices=[
+        questionary.Choice(title=f"🩹 {_('Fix it')}", value="fix"),
+        questionary.Choice(title=f"❌ {_('Exit')}", value="exit"),
+    ]).ask()
+    return action == "fix"
 
-def run_or_revise_flow(script: str, key: str, model: str, silent_mode: bool):
+def run_or_revise_flow(
+    script: str,
+    key: str,
+    model: str,
+    silent_mode: bool,
+    explanation: Optional[BackgroundExplanation] = None,
+    candidates: Optional[List[CheckedScript]] = None,
+):
     """Handles the user's choice to run, edit, revise, or copy the script."""
+    # Imported here rather than at the top so the first status line shows sooner
+    import questionary
+    from prompt_toolkit.patch_stdout import patch_stdout
+
     while True:
         empty_script = not script.strip()
         message = _("Revise this script?") if empty_script else _("Run this script?")
@@ -122,40 +355,58 @@ def run_or_revise_flow(script: str, key: str, model: str, silent_mode: bool):
                 questionary.Choice(title=f"📝 {_('Edit')}", value="edit"),
             ])
         
+        if candidates and len(candidates) > 1:
+            choices.append(questionary.Choice(title=f"🔀 {_('Other candidates')} ({len(candidates)})", value="candidates"))
         choices.extend([
             questionary.Choice(title=f"🔁 {_('Revise')}", value="revise"),
             questionary.Choice(title=f"📋 {_('Copy')}", value="copy"),
             questionary.Choice(title=f"❌ {_('Cancel')}", value="cancel"),
         ])
 
-        action = questionary.select(message, choices=choices).ask()
+        # While the explanation is still streaming, keep its output above the menu
+        streaming = explanation is not None and explanation.active
+        with patch_stdout() if streaming else nullcontext(), span("menu"):
+            action = questionary.select(message, choices=choices).ask()
+        if explanation is not None:
+            explanation.stop()
+            explanation = None
 
-        if action == "yes":
-            run_script(script)
-            break
-        elif action == "edit":
-            new_script = questionary.text(_("you can edit script here"), default=script).ask()
-            if new_script:
-                run_script(new_script)
-            break
+        revision_prompt = None
+        if action in ("yes", "edit"):
+            if action == "edit":
+                script = questionary.text(_("you can edit script here"), default=script).ask()
+                if not script:
+                    break
+            result = run_script(script)
+            if not _offer_fix(result):
+                break
+            # One round trip: the exit code and output tail go straight into the revision
+            revision_prompt = failure_prompt(result)
         elif action == "revise":
             revision_prompt = questionary.text(_("What would you like me to change in this script?")).ask()
             if not revision_prompt:
                 continue
 
-            with console.status(f"[cyan]{_('Loading...')}[/cyan]") as status:
-                script = get_revision(prompt=revision_prompt, code=script, key=key, model=model)
-                status.update(f"[bold green]{_('Your new script')}:[/bold green]")
-                console.print(f"\n[bold yellow]{script}[/bold yellow]\n")
-
-                if not silent_mode and script:
-                    status.update(f"[cyan]{_('Getting explanation...')}[/cyan]")
-                    explanation_stream = get_explanation(script=script, key=key, model=model)
-                    status.update(f"[bold green]{_('Explanation')}:[/bold green]")
-                    print()
-                    read_stream_and_print(explanation_stream)
-                    print("\n")
+        if revision_prompt:
+            with LiveScript() as live, span("revise"):
+                for delta in stream_revision(prompt=revision_prompt, code=script, key=key, model=model):
+                    live.update(delta)
+            script = live.script
+
+            if not silent_mode and script:
+                _explain(script, key, model)
+        elif action == "candidates":
+            choice = questionary.select(_("Pick a candidate"), choices=[
+                *(questionary.Choice(title=_candidate_title(c), value=c.script) for c in candidates),
+                questionary.Choice(title=f"↩ {_('Back')}", value=None),
+            ]).ask()
+            if choice and choice != script:
+                script = choice
+                console.print(Group(Text(), Text(script, style="bold yellow"), Text()))
+                if not silent_mode:
+                    _explain(script, key, model)
         elif action == "copy":
+            import pyperclip
             pyperclip.copy(script)
             console.print(f"[green]✔ {_('Copied to clipboard!')}[/green]")
             break
@@ -0,0 +1,69 @@
+import json
+from typing import Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+from typing_extensions import Annotated
+
+from helpers.error import KnownError
+from helpers.i18n import _
+from helpers.usage import LEDGER_PATH, get_usage_ledger, parse_window
+
+stats_app = typer.Typer(
+    help="Show latency percentiles, token usage and cache hit rates from the local usage ledger.",
+)
+console = Console()
+
+GROUPS = ("operation", "model", "provider", "day")
+
+
+def _ms(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    return f"{value / 1000:.2f}s" if value >= 1000 else f"{value:.0f}ms"
+
+
+@stats_app.callback(invoke_without_command=True)
+def main(
+    since: Annotated[str, typer.Option("--since", "-s", help="Time window: e.g. 24h, 7d, 4w, or all.")] = "7d",
+    by: Annotated[str, typer.Option("--by", "-b", help=f"Group by {', '.join(GROUPS)}.")] = "operation",
+    as_json: Annotated[bool, typer.Option("--json", help="Print JSON instead of a table.")] = False,
+):
+    """
+    Summarizes model calls: counts, cache and template hits, latency and time-to-first-token percentiles, tokens.
+    """
+    if by not in GROUPS:
+        raise KnownError(f"{_('Invalid grouping')}: {by} ({', '.join(GROUPS)})")
+    try:
+        start = parse_window(since)
+    except ValueError:
+        raise KnownError(f"{_('Invalid time window')}: {since}") from None
+
+    summaries = get_usage_ledger().summarize(start, by)
+    if as_json:
+        print(json.dumps([s._asdict() for s in summaries], indent=2))
+        return
+    if not summaries:
+        console.print(f"[dim]{_('No usage recorded yet')} ({LEDGER_PATH})[/dim]")
+        return
+
+    table = Table(title=f"{_('Usage')} ({since})", title_justify="left")
+    table.add_column(_(by.capitalize()))
+    for column in ("Calls", "Cached", "Templates", "Errors", "Latency p50/p95/p99", "TTFT p50/p95", "Tokens in/out"):
+        table.add_column(_(column), justify="right")
+    for s in summaries:
+        # Hit rate among the lookups that could have gone to the model
+        answered = s.model_calls + s.cache_hits
+        table.add_row(
+            s.group or "-",
+            str(s.calls),
+            f"{s.cache_hits} ({s.cache_hits / answered:.0%})" if answered else "-",
+            str(s.template_hits),
+            str(s.errors),
+            " / ".join(_ms(s.latency[p]) for p in ("p50", "p95", "p99")),
+            " / ".join(_ms(s.ttft[p]) for p in ("p50", "p95")),
+            f"~{s.prompt_tokens} / ~{s.response_tokens}",
+        )
+    console.print(table)
+    console.print(f"[dim]{_('Latencies are for model calls only; tokens are estimates.')}[/dim]")
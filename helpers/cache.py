@@ -0,0 +1,156 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import get_config, DEFAULT_CONFIG
+
+CACHE_PATH = Path.home() / ".ai_shell_cache.db"
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapses whitespace so trivially different prompts share a cache entry."""
+    return " ".join(text.split())
+
+
+def make_cache_key(kind: str, *parts: str) -> str:
+    """Content-addresses a response by what it was generated from."""
+    payload = json.dumps([kind, *parts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    A small SQLite-backed response cache with a TTL and LRU eviction.
+    Any storage error is treated as a miss so the cache can never break a command.
+    SQLite connections can't be shared between threads, so each thread opens its own.
+    """
+
+    def __init__(self, path: Path, ttl: int, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2)
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _bump(self, conn: sqlite3.Connection, name: str):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached value for `key`, or None on a miss or expiry."""
+        if not self.enabled:
+            return None
+        try:
+            conn = self._connect()
+            now = time.time()
+            with conn:
+                row = conn.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    self._bump(conn, "hits")
+                    return row[0]
+                if row:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bump(conn, "misses")
+            return None
+        except sqlite3.ProgrammingError:
+            # Misuse of the API is a bug, not a storage problem
+            raise
+        except sqlite3.Error:
+            return None
+
+    def put(self, key: str, kind: str, value: str):
+        """Stores a response, then drops expired and least recently used entries."""
+        if not self.enabled or not value:
+            return
+        try:
+            conn = self._connect()
+            now = time.time()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, kind, value, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, value, now, now),
+                )
+                conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.ProgrammingError:
+            raise
+        except sqlite3.Error:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        entries = dict(conn.execute("SELECT kind, COUNT(*) FROM responses GROUP BY kind").fetchall())
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "path": str(self.path),
+            "size_bytes": self.path.stat().st_size if self.path.exists() else 0,
+            "entries": entries,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+        }
+
+    def clear(self) -> int:
+        """Removes every cached response and resets the counters."""
+        conn = self._connect()
+        with conn:
+            removed = conn.execute("DELETE FROM responses").rowcount
+            conn.execute("DELETE FROM counters")
+        conn.execute("VACUUM")
+        return removed
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Returns the process-wide response cache configured from the config file."""
+    global _response_cache
+    if _response_cache is None:
+        config = get_config()
+        _response_cache = ResponseCache(
+            CACHE_PATH,
+            ttl=int(config.get("CACHE_TTL", DEFAULT_CONFIG["CACHE_TTL"])),
+            max_entries=int(config.get("CACHE_MAX_ENTRIES", DEFAULT_CONFIG["CACHE_MAX_ENTRIES"])),
+        )
+    return _response_cache
@@ -0,0 +1,353 @@
+import asyncio
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+from .config import get_config, DEFAULT_CONFIG
+from .tracing import record
+
+# Errors worth retrying: rate limiting and temporary unavailability
+RETRYABLE_ERROR = re.compile(r"\b(429|500|502|503|504|RESOURCE_EXHAUSTED|UNAVAILABLE|DEADLINE_EXCEEDED)\b|rate limit", re.IGNORECASE)
+RETRY_AFTER = re.compile(r"retry[ _-]?(?:after|delay|in)[\"':\s]*([\d.]+)\s*s?", re.IGNORECASE)
+
+# Observed latencies needed before hedging goes by their p95 instead of HEDGE_AFTER
+MIN_HEDGE_SAMPLES = 20
+
+
+class CallTimeout(Exception):
+    """A model call took longer than the policy allows."""
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    hedges: int = 0
+
+
+# Counts for the whole process, plus whatever collect_stats() blocks are open on this thread
+process_stats = CallStats()
+_local = threading.local()
+_stats_lock = threading.Lock()
+
+
+@contextmanager
+def collect_stats():
+    """Counts the calls made by this thread inside the block."""
+    stats = CallStats()
+    collectors = getattr(_local, "collectors", [])
+    _local.collectors = collectors + [stats]
+    try:
+        yield stats
+    finally:
+        _local.collectors = collectors
+
+
+def _count(field: str):
+    with _stats_lock:
+        for stats in [process_stats, *getattr(_local, "collectors", [])]:
+            setattr(stats, field, getattr(stats, field) + 1)
+
+
+class _Latencies:
+    """Recent latencies per kind of call, for the hedging threshold."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Dict[str, Deque[float]] = {}
+        self._size = size
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(kind, deque(maxlen=self._size)).append(seconds)
+
+    def p95(self, kind: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(kind, ()))
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95)]
+
+
+latencies = _Latencies()
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, CallTimeout) or bool(RETRYABLE_ERROR.search(str(error)))
+
+
+def retry_delay(error: BaseException, attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Seconds to wait before retry number `attempt + 1`: the server's retry-after hint, else full jitter."""
+    match = RETRY_AFTER.search(str(error))
+    if match:
+        return min(float(match.group(1)), cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+_CHUNK, _DONE, _ERROR = range(3)
+
+
+class _Attempt:
+    """One request running on a daemon thread; what it yields is handed over through a shared queue."""
+
+    def __init__(self, start: Callable[[], Iterable], results: "queue.Queue"):
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        self._results = results
+        threading.Thread(target=self._run, args=(start,), daemon=True).start()
+
+    def _run(self, start: Callable[[], Iterable]):
+        stream = None
+        try:
+            stream = start()
+            for chunk in stream:
+                if self.cancelled.is_set():
+                    break
+                self._results.put((self, _CHUNK, chunk))
+            else:
+                self._results.put((self, _DONE, None))
+        except BaseException as e:
+            self._results.put((self, _ERROR, e))
+        finally:
+            close = getattr(stream, "close", None)
+            if self.cancelled.is_set() and close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    """
+    How model calls are made: `timeout` bounds a whole call and `first_token_timeout`
+    the wait for its first chunk. Failed or timed-out calls are retried up to
+    `retries` times with backoff while nothing has been returned yet. With `hedge`,
+    a duplicate request is raced against a slow one after `hedge_after` seconds, or
+    the p95 of recent calls once there are enough of them.
+    """
+    timeout: float = 120.0
+    first_token_timeout: float = 30.0
+    retries: int = 2
+    backoff_base: float = 1.0
+    backoff_cap: float = 30.0
+    hedge: bool = False
+    hedge_after: float = 3.0
+
+    def _hedge_delay(self, kind: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        p95 = latencies.p95(kind)
+        return p95 if p95 is not None else self.hedge_after
+
+    def _backoff(self, error: BaseException, attempt: int) -> bool:
+        """Sleeps before the next retry; False if there shouldn't be one."""
+        if attempt >= self.retries or not is_retryable(error):
+            return False
+        _count("retries")
+        start = time.perf_counter()
+        time.sleep(retry_delay(error, attempt, self.backoff_base, self.backoff_cap))
+        record("retry", start, time.perf_counter(), attempt=attempt + 1, error=str(error)[:200])
+        return True
+
+    async def _abackoff(self, error: BaseException, attempt: int) -> bool:
+        if attempt >= self.retries or not is_retryable(error):
+            return False
+        _count("retries")
+        start = time.perf_counter()
+        await asyncio.sleep(retry_delay(error, attempt, self.backoff_base, self.backoff_cap))
+        record("retry", start, time.perf_counter(), attempt=attempt + 1, error=str(error)[:200])
+        return True
+
+    def _first(self, start: Callable[[], Iterable], results: "queue.Queue", kind: str, timeout: float):
+        """Starts the request (and its hedge, if it's slow) and returns the attempt that answered first."""
+        attempts: List[_Attempt] = [_Attempt(start, results)]
+        begin = time.monotonic()
+        deadline = begin + timeout
+        hedge_delay = self._hedge_delay(kind)
+        hedge_at = begin + hedge_delay if hedge_delay is not None else None
+        failed = 0
+        while True:
+            now = time.monotonic()
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            try:
+                attempt, status, value = results.get(timeout=max(0.0, wake - now))
+            except queue.Empty:
+                if hedge_at is not None and time.monotonic() < deadline:
+                    _count("hedges")
+                    attempts.append(_Attempt(start, results))
+                    hedge_at = None
+                    continue
+                for a in attempts:
+                    a.cancel()
+                _count("timeouts")
+                raise CallTimeout(f"No response within {timeout:g}s")
+            if attempt.cancelled.is_set():
+                continue
+            if status == _ERROR:
+                failed += 1
+                # Give a hedge that is still running the chance to answer
+                if failed < len(attempts):
+                    continue
+                raise value
+            for other in attempts:
+                if other is not attempt:
+                    other.cancel()
+            latencies.add(kind, time.monotonic() - attempt.started)
+            return attempt, status, value
+
+    def stream(self, start: Callable[[], Iterable], kind: str = "stream") -> Iterator:
+        """Iterates the stream `start()` returns, under this policy."""
+        _count("calls")
+        attempt_number = 0
+        while True:
+            results: "queue.Queue" = queue.Queue()
+            try:
+                winner, status, value = self._first(start, results, kind, self.first_token_timeout)
+                break
+            except Exception as e:
+                if not self._backoff(e, attempt_number):
+                    raise
+                attempt_number += 1
+
+        # Past the first chunk there is no retrying: the caller has already seen output
+        deadline = winner.started + self.timeout
+        try:
+            while status == _CHUNK:
+                yield value
+                while True:
+                    try:
+                        attempt, status, value = results.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        _count("timeouts")
+                        raise CallTimeout(f"Response not finished within {self.timeout:g}s")
+                    if attempt is winner:
+                        break
+            if status == _ERROR:
+                raise value
+        finally:
+            winner.cancel()
+
+    def call(self, fn: Callable[[], Any], kind: str = "call") -> Any:
+        """Runs a blocking call under this policy."""
+        return next(iter(replace(self, first_token_timeout=self.timeout).stream(lambda: [fn()], kind)))
+
+    async def astream(self, start: Callable[[], Awaitable[AsyncIterator]], kind: str = "stream") -> AsyncIterator:
+        """Async version of stream(), for the chat loop. `start` is e.g. `lambda: llm.astream_chat(messages)`."""
+        _count("calls")
+
+        async def first_chunk():
+            started = time.monotonic()
+            iterator = (await start()).__aiter__()
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return started, iterator, _DONE, None
+            return started, iterator, _CHUNK, chunk
+
+        attempt_number = 0
+        while True:
+            try:
+                started, iterator, status, value = await self._afirst(first_chunk, kind)
+                break
+            except Exception as e:
+                if not await self._abackoff(e, attempt_number):
+                    raise
+                attempt_number += 1
+
+        deadline = started + self.timeout
+        while status == _CHUNK:
+            yield value
+            try:
+                value = await asyncio.wait_for(iterator.__anext__(), max(0.0, deadline - time.monotonic()))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                _count("timeouts")
+                raise CallTimeout(f"Response not finished within {self.timeout:g}s")
+
+    async def _afirst(self, first_chunk: Callable[[], Awaitable], kind: str):
+        tasks = [asyncio.ensure_future(first_chunk())]
+        begin = time.monotonic()
+        deadline = begin + self.first_token_timeout
+        hedge_delay = self._hedge_delay(kind)
+        hedge_at = begin + hedge_delay if hedge_delay is not None else None
+        try:
+            while True:
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _pending = await asyncio.wait(
+                    tasks, timeout=max(0.0, wake - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if hedge_at is not None and time.monotonic() < deadline:
+                        _count("hedges")
+                        tasks.append(asyncio.ensure_future(first_chunk()))
+                        hedge_at = None
+                        continue
+                    _count("timeouts")
+                    raise CallTimeout(f"No response within {self.first_token_timeout:g}s")
+                for task in done:
+                    if task.exception() is None:
+                        result = task.result()
+                        latencies.add(kind, time.monotonic() - result[0])
+                        return result
+                tasks = [t for t in tasks if t not in done]
+                if not tasks:
+                    raise next(iter(done)).exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def acall(self, fn: Callable[[], Awaitable], kind: str = "call") -> Any:
+        """Runs an async call with the timeout and retries (no hedging)."""
+        _count("calls")
+        attempt_number = 0
+        while True:
+            try:
+                return await asyncio.wait_for(fn(), self.timeout)
+            except asyncio.TimeoutError:
+                _count("timeouts")
+                error: Exception = CallTimeout(f"No response within {self.timeout:g}s")
+            except Exception as e:
+                error = e
+            if not await self._abackoff(error, attempt_number):
+                raise error
+            attempt_number += 1
+
+
+_override: Optional[CallPolicy] = None
+
+
+def set_call_policy(policy: Optional[CallPolicy]):
+    """Overrides the configured policy for this process (e.g. `ai batch --retries`); None restores it."""
+    global _override
+    _override = policy
+
+
+def get_call_policy() -> CallPolicy:
+    """The policy from config: CALL_TIMEOUT, FIRST_TOKEN_TIMEOUT, CALL_RETRIES, HEDGE_REQUESTS and HEDGE_AFTER."""
+    if _override is not None:
+        return _override
+    config = get_config()
+
+    def setting(name: str):
+        return config.get(name, DEFAULT_CONFIG[name])
+
+    return CallPolicy(
+        timeout=float(setting("CALL_TIMEOUT")),
+        first_token_timeout=float(setting("FIRST_TOKEN_TIMEOUT")),
+        retries=int(setting("CALL_RETRIES")),
+        hedge=str(setting("HEDGE_REQUESTS")).lower() == "true",
+        hedge_after=float(setting("HEDGE_AFTER")),
+    )
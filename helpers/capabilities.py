@@ -0,0 +1,216 @@
+import json
+import os
+import platform
+import re
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+INDEX_PATH = Path.home() / ".ai_shell_capabilities.json"
+INDEX_VERSION = 1
+
+# Tools the model likes to reach for; we say which of them are installed
+NOTABLE_TOOLS = [
+    "fd", "fdfind", "rg", "ag", "jq", "yq", "bat", "eza", "exa", "fzf", "tree",
+    "curl", "wget", "git", "docker", "podman", "kubectl", "python3", "node", "perl",
+    "gawk", "gsed", "gfind", "ggrep", "gdate", "xclip", "xsel", "wl-copy", "pbcopy",
+    "apt", "dnf", "yum", "pacman", "apk", "zypper", "brew", "systemctl", "ss", "netstat", "ip", "ifconfig",
+]
+# Of those, the ones worth ruling out explicitly when missing: the usual stand-ins for standard tools
+ALTERNATIVE_TOOLS = ["fd", "rg", "ag", "bat", "eza", "exa", "fzf", "gawk", "gsed", "gfind", "ggrep", "gdate"]
+# Tools whose flags differ between GNU, BSD and BusyBox; their --version is probed
+FLAVOR_TOOLS = ["sed", "grep", "find", "awk", "ls", "xargs", "date", "stat", "tar"]
+# How a prompt names a program explicitly: `in backticks`, or followed by a flag or a path
+TOOL_MENTION = re.compile(r"`([A-Za-z][\w.+-]*)[^`]*`|\b([A-Za-z][\w.+-]*) +(?:--?[A-Za-z0-9]|[\w.~-]*/)")
+
+
+def _scan_dir(directory: str) -> List[str]:
+    names = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        names.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return sorted(names)
+
+
+def _dir_mtime(directory: str) -> Optional[int]:
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _probe(path: str) -> Dict[str, str]:
+    """Works out a tool's flavor (gnu, bsd, busybox...) and version from `--version`."""
+    try:
+        proc = subprocess.run(
+            [path, "--version"], capture_output=True, text=True, timeout=1, stdin=subprocess.DEVNULL
+        )
+        output = (proc.stdout or proc.stderr).strip()
+    except (OSError, subprocess.SubprocessError):
+        return {"flavor": "unknown", "version": ""}
+    first_line = output.splitlines()[0][:80] if output else ""
+    if "GNU" in output or "gawk" in output.lower():
+        flavor = "gnu"
+    elif "BusyBox" in output:
+        flavor = "busybox"
+    elif "uutils" in output:
+        flavor = "uutils"
+    elif "mawk" in output.lower():
+        flavor = "mawk"
+    elif proc.returncode != 0:
+        # BSD tools reject --version
+        flavor = "bsd"
+    else:
+        flavor = "other"
+    version = re.search(r"\d+(\.\d+)+", first_line)
+    return {"flavor": flavor, "version": version.group(0) if version else ""}
+
+
+def _distro() -> str:
+    system = platform.system()
+    if system == "Darwin":
+        return f"macOS {platform.mac_ver()[0]}".strip()
+    try:
+        with open("/etc/os-release", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("PRETTY_NAME="):
+                    return line.split("=", 1)[1].strip().strip('"')
+    except OSError:
+        pass
+    return f"{system} {platform.release()}".strip()
+
+
+class CapabilityIndex:
+    """
+    Executables on PATH plus the flavor of the usual GNU/BSD-sensitive tools,
+    persisted as JSON. Only PATH directories whose mtime changed are rescanned,
+    and a tool is only re-probed when its binary changes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.dirs: Dict[str, Dict] = {}
+        self.probes: Dict[str, Dict] = {}
+        self.distro = ""
+        self.executables: Dict[str, str] = {}
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION:
+            self.dirs = data.get("dirs", {})
+            self.probes = data.get("probes", {})
+            self.distro = data.get("distro", "")
+
+    def _save(self):
+        data = {"version": INDEX_VERSION, "dirs": self.dirs, "probes": self.probes, "distro": self.distro}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def refresh(self, search_path: Optional[str] = None):
+        """Brings the index up to date with PATH, rescanning only what changed."""
+        self._load()
+        changed = False
+        path_dirs = list(dict.fromkeys(d for d in (search_path or os.environ.get("PATH", "")).split(os.pathsep) if d))
+
+        for directory in path_dirs:
+            mtime = _dir_mtime(directory)
+            cached = self.dirs.get(directory)
+            if cached is None or cached.get("mtime_ns") != mtime:
+                self.dirs[directory] = {"mtime_ns": mtime, "executables": _scan_dir(directory) if mtime else []}
+                changed = True
+
+        # The first directory on PATH wins, like the shell's lookup
+        self.executables = {}
+        for directory in path_dirs:
+            for name in self.dirs[directory]["executables"]:
+                self.executables.setdefault(name, directory)
+
+        stale = {}
+        for tool in FLAVOR_TOOLS:
+            directory = self.executables.get(tool)
+            if directory is None:
+                if self.probes.pop(tool, None) is not None:
+                    changed = True
+                continue
+            binary = os.path.realpath(os.path.join(directory, tool))
+            try:
+                stamp = os.stat(binary).st_mtime_ns
+            except OSError:
+                continue
+            probe = self.probes.get(tool)
+            if probe is None or probe.get("binary") != binary or probe.get("mtime_ns") != stamp:
+                stale[tool] = (binary, stamp)
+        if stale:
+            with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+                results = dict(zip(stale, pool.map(_probe, [binary for binary, _stamp in stale.values()])))
+            for tool, (binary, stamp) in stale.items():
+                self.probes[tool] = {"binary": binary, "mtime_ns": stamp, **results[tool]}
+            changed = True
+
+        if changed or not self.distro:
+            self.distro = _distro()
+            self._save()
+
+    def has(self, name: str) -> bool:
+        return name in self.executables
+
+    def describe(self) -> str:
+        """A short description of the environment for the generation prompt."""
+        parts = [f"The system is {self.distro}."] if self.distro else []
+
+        by_flavor: Dict[str, List[str]] = {}
+        for tool in FLAVOR_TOOLS:
+            probe = self.probes.get(tool)
+            if probe and probe["flavor"] not in ("other", "unknown"):
+                by_flavor.setdefault(probe["flavor"], []).append(f"{tool} {probe['version']}".strip())
+        if by_flavor:
+            parts.append("Tool flavors: " + "; ".join(f"{flavor} {', '.join(tools)}" for flavor, tools in by_flavor.items()) + ".")
+
+        installed = [t for t in NOTABLE_TOOLS if self.has(t)]
+        missing = [t for t in ALTERNATIVE_TOOLS if not self.has(t)]
+        if installed:
+            parts.append(f"Installed: {', '.join(installed)}.")
+        if missing:
+            parts.append(f"Not installed: {', '.join(missing)}.")
+        return " ".join(parts)
+
+    def mentioned(self, prompt: str) -> List[str]:
+        """Installed programs the prompt names explicitly that describe() doesn't already list."""
+        return list(dict.fromkeys(
+            w for match in TOOL_MENTION.finditer(prompt) for w in match.groups()
+            if w and w not in NOTABLE_TOOLS and w not in FLAVOR_TOOLS and self.has(w)
+        ))
+
+
+_capabilities: Optional[CapabilityIndex] = None
+_capabilities_lock = threading.Lock()
+
+
+def get_capabilities() -> CapabilityIndex:
+    """The process-wide index, refreshed against PATH on first use."""
+    global _capabilities
+    with _capabilities_lock:
+        if _capabilities is None:
+            index = CapabilityIndex(INDEX_PATH)
+            index.refresh()
+            _capabilities = index
+        return _capabilities
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from typing import List, Optional
+
+import questionary
+from prompt_toolkit.patch_stdout import patch_stdout
+from rich.console import Console
+
+from .call_policy import collect_stats, get_call_policy
+from .chat_history import ChatHistory, estimate_tokens
+from .i18n import _
+from .render import StreamRenderer
+from .usage import record_usage
+
+console = Console()
+
+
+class ChatEngine:
+    """
+    An asyncio chat loop. The input prompt stays open while replies stream in
+    above it, and Ctrl-C cancels the reply in flight instead of ending the session.
+    """
+
+    def __init__(self, llm, history: ChatHistory, model: str = ""):
+        self.llm = llm
+        self.history = history
+        self.model = model
+        self._replies: List[asyncio.Task] = []
+
+    async def run(self):
+        # raw=True lets rich's colour codes through the stdout proxy
+        with patch_stdout(raw=True):
+            while True:
+                try:
+                    prompt = await questionary.text(f"{_('You')}:").unsafe_ask_async()
+                except KeyboardInterrupt:
+                    if self.cancel_reply():
+                        continue
+                    break
+                except EOFError:
+                    break
+
+                if not prompt or prompt.lower() == 'exit':
+                    break
+                # Prompts sent while a reply is still streaming are answered in order
+                self._replies = [task for task in self._replies if not task.done()]
+                after = self._replies[-1] if self._replies else None
+                self._replies.append(asyncio.create_task(self._respond(prompt, after=after)))
+
+            self.cancel_reply()
+        console.print(f"[yellow]{_('Goodbye!')}[/yellow]")
+
+    def cancel_reply(self) -> bool:
+        """Cancels the reply in flight and any queued behind it. Returns False if there were none."""
+        pending = [task for task in self._replies if not task.done()]
+        for task in pending:
+            task.cancel()
+        self._replies = []
+        return bool(pending)
+
+    async def _respond(self, prompt: str, after: Optional[asyncio.Task] = None):
+        if after is not None:
+            await asyncio.wait([after])
+
+        messages = self.history.messages(prompt)
+        prompt_tokens = sum(estimate_tokens(m.content or "") for m in messages)
+        console.print("\n[bold green]AI Shell:[/bold green]")
+
+        renderer = StreamRenderer()
+        start = time.perf_counter()
+        ttft = None
+        try:
+            with renderer, collect_stats() as stats:
+                response_stream = get_call_policy().astream(lambda: self.llm.astream_chat(messages))
+                async for r in response_stream:
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    renderer.write(r.delta)
+        except asyncio.CancelledError:
+            # The unanswered turn never makes it into the history
+            console.print(f"\n[yellow]{_('Response cancelled')}[/yellow]\n")
+            raise
+        except Exception as e:
+            console.print(f"\n[red]✖ A chat error occurred: {e}[/red]\n")
+            record_usage("chat", self.model, latency=time.perf_counter() - start, ttft=ttft, error=True, prompt_tokens=prompt_tokens)
+            return
+        record_usage(
+            "chat", self.model, response=renderer.text, latency=time.perf_counter() - start, ttft=ttft, prompt_tokens=prompt_tokens
+        )
+
+        print() # Newline after response
+        retried = f", {_('retries')}: {stats.retries}" if stats.retries else ""
+        console.print(f"[dim]~{prompt_tokens} {_('prompt tokens')}{retried}[/dim]\n")
+        self.history.add_turn(prompt, renderer.text, prompt_tokens)
+        await self.history.compact(self.llm, self.model)
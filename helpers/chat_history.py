@@ -0,0 +1,109 @@
+import textwrap
+import time
+from dataclasses import dataclass
+from typing import List
+
+from .call_policy import get_call_policy
+from .llm import Message
+
+# Keep at least this many recent turns verbatim, whatever the budget
+MIN_RECENT_TURNS = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class ChatTurn:
+    user: str
+    assistant: str
+    prompt_tokens: int  # estimated size of the request that produced this reply
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.user) + estimate_tokens(self.assistant)
+
+
+class ChatHistory:
+    """
+    Chat history with a token budget. Recent turns are kept verbatim; once they
+    outgrow the budget, the oldest ones are folded into a rolling summary so the
+    request size stays roughly flat however long the session runs.
+
+    With a `store` (see chat_sessions.ChatSession), new turns and summaries are
+    also written to disk so the conversation can be resumed later.
+    """
+
+    def __init__(self, token_budget: int, store=None):
+        self.token_budget = token_budget
+        self.summary = ""
+        self.turns: List[ChatTurn] = []
+        self.store = store
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(turn.tokens for turn in self.turns)
+
+    def messages(self, prompt: str) -> List[Message]:
+        """The messages to send for a new user prompt."""
+        messages = []
+        if self.summary:
+            messages.append(Message(
+                role="system",
+                content=f"Summary of the earlier conversation:\n{self.summary}",
+            ))
+        for turn in self.turns:
+            messages.append(Message(role="user", content=turn.user))
+            messages.append(Message(role="assistant", content=turn.assistant))
+        messages.append(Message(role="user", content=prompt))
+        return messages
+
+    def add_turn(self, prompt: str, reply: str, prompt_tokens: int) -> ChatTurn:
+        turn = ChatTurn(user=prompt, assistant=reply, prompt_tokens=prompt_tokens)
+        self.turns.append(turn)
+        if self.store is not None:
+            self.store.record_turn(turn)
+        return turn
+
+    def _turns_to_fold(self) -> List[ChatTurn]:
+        """The oldest turns to drop so the rest fits in half the budget, leaving room to grow."""
+        target = self.token_budget // 2
+        total = self.tokens
+        count = 0
+        while total > target and len(self.turns) - count > MIN_RECENT_TURNS:
+            total -= self.turns[count].tokens
+            count += 1
+        return self.turns[:count]
+
+    async def compact(self, llm, model: str = ""):
+        """Folds the oldest turns into the summary once the history is over budget."""
+        if self.tokens <= self.token_budget:
+            return
+        old_turns = self._turns_to_fold()
+        if not old_turns:
+            return
+
+        transcript = "\n".join(f"User: {t.user}\nAssistant: {t.assistant}" for t in old_turns)
+        prompt = textwrap.dedent(f"""
+            Update the running summary of a conversation with the new exchanges below.
+            Keep every fact, decision, command and file name that later messages might refer to.
+            Reply with the summary only, in at most {max(self.token_budget // 16, 50)} words.
+            Current summary: {self.summary or "(none)"}
+            New exchanges:
+        """) + transcript
+        # Imported here: usage imports this module for estimate_tokens
+        from .usage import record_usage
+
+        start = time.perf_counter()
+        try:
+            response = await get_call_policy().acall(lambda: llm.achat([Message(role="user", content=prompt)]))
+            self.summary = (response.message.content or "").strip()
+            record_usage("summary", model, prompt=prompt, response=self.summary, latency=time.perf_counter() - start)
+        except Exception:
+            # Without a summary the old turns are simply dropped; the budget still holds
+            record_usage("summary", model, prompt=prompt, latency=time.perf_counter() - start, error=True)
+        self.turns = self.turns[len(old_turns):]
+        if self.store is not None:
+            self.store.record_summary(self.summary, kept=len(self.turns))
@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import struct
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .chat_history import ChatHistory, ChatTurn
+from .error import KnownError
+from .i18n import _
+
+SESSIONS_PATH = Path.home() / ".ai_shell_sessions"
+SESSION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+# Each index entry is the record's byte offset in the log and its type
+INDEX_ENTRY = struct.Struct("<QB")
+TURN, SUMMARY = 0, 1
+
+
+class SessionInfo(NamedTuple):
+    name: str
+    records: int
+    modified: float
+
+
+class ChatSession:
+    """
+    A chat transcript on disk: an append-only JSONL log plus an index of record
+    offsets. A summary record is a checkpoint (the summary so far and how many of
+    the turns before it are still kept verbatim), so resuming only reads the
+    records after the last checkpoint and the few turns it kept.
+    """
+
+    def __init__(self, name: str, root: Path = SESSIONS_PATH):
+        if not SESSION_NAME.match(name):
+            raise KnownError(f"{_('Invalid session name')}: {name}")
+        self.name = name
+        self.log_path = root / f"{name}.jsonl"
+        self.index_path = root / f"{name}.idx"
+
+    @contextmanager
+    def _locked(self):
+        self.log_path.parent.mkdir(mode=0o700, exist_ok=True)
+        with open(self.log_path, "ab") as log:
+            if fcntl is not None:
+                fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                yield log
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(log, fcntl.LOCK_UN)
+
+    def _append(self, kind: int, record: dict):
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._locked() as log:
+            offset = log.seek(0, os.SEEK_END)
+            log.write(line)
+            log.flush()
+            with open(self.index_path, "ab") as index:
+                index.write(INDEX_ENTRY.pack(offset, kind))
+
+    def record_turn(self, turn: ChatTurn):
+        self._append(TURN, {
+            "type": "turn", "user": turn.user, "assistant": turn.assistant,
+            "prompt_tokens": turn.prompt_tokens, "ts": int(time.time()),
+        })
+
+    def record_summary(self, summary: str, kept: int):
+        self._append(SUMMARY, {"type": "summary", "summary": summary, "kept": kept, "ts": int(time.time())})
+
+    def _read_index(self) -> List[Tuple[int, int]]:
+        data = self.index_path.read_bytes() if self.index_path.exists() else b""
+        data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+        entries = [INDEX_ENTRY.unpack_from(data, i) for i in range(0, len(data), INDEX_ENTRY.size)]
+        if self._index_matches_log(entries):
+            return entries
+        return self._rebuild_index()
+
+    def _index_matches_log(self, entries: List[Tuple[int, int]]) -> bool:
+        """The last indexed record must be the last line of the log (a crash can leave them apart)."""
+        size = self.log_path.stat().st_size if self.log_path.exists() else 0
+        if not entries:
+            return size == 0
+        last_offset = entries[-1][0]
+        if last_offset >= size:
+            return False
+        with open(self.log_path, "rb") as log:
+            log.seek(last_offset)
+            tail = log.read()
+        return tail.count(b"\n") == 1 and tail.endswith(b"\n")
+
+    def _rebuild_index(self) -> List[Tuple[int, int]]:
+        entries = []
+        offset = 0
+        if self.log_path.exists():
+            with open(self.log_path, "rb") as log:
+                for line in log:
+                    if line.endswith(b"\n"):
+                        try:
+                            kind = SUMMARY if json.loads(line).get("type") == "summary" else TURN
+                            entries.append((offset, kind))
+                        except ValueError:
+                            pass
+                    offset += len(line)
+        with open(self.index_path, "wb") as index:
+            index.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in entries))
+        return entries
+
+    def _read_records(self, offsets: List[int]) -> List[dict]:
+        records = []
+        with open(self.log_path, "rb") as log:
+            for offset in offsets:
+                log.seek(offset)
+                records.append(json.loads(log.readline()))
+        return records
+
+    def load(self, token_budget: int) -> ChatHistory:
+        """The history to resume with: the last summary and the turns it kept or that came after."""
+        history = ChatHistory(token_budget, store=self)
+        if not self.log_path.exists():
+            return history
+        entries = self._read_index()
+        last_summary = next((i for i in range(len(entries) - 1, -1, -1) if entries[i][1] == SUMMARY), None)
+
+        offsets = []
+        if last_summary is None:
+            offsets = [offset for offset, _kind in entries]
+        else:
+            checkpoint = self._read_records([entries[last_summary][0]])[0]
+            history.summary = checkpoint["summary"]
+            kept = checkpoint["kept"]
+            before = [offset for offset, kind in entries[:last_summary] if kind == TURN]
+            offsets = (before[-kept:] if kept else []) + [offset for offset, _kind in entries[last_summary + 1:]]
+
+        for record in self._read_records(offsets):
+            if record.get("type") == "turn":
+                history.turns.append(ChatTurn(record["user"], record["assistant"], record.get("prompt_tokens", 0)))
+        return history
+
+
+def list_sessions(root: Path = SESSIONS_PATH) -> List[SessionInfo]:
+    """All sessions, most recently used first. Only stats files; no transcript is read."""
+    sessions = []
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return []
+    for entry in entries:
+        if entry.name.endswith(".idx"):
+            st = entry.stat()
+            sessions.append(SessionInfo(entry.name[:-len(".idx")], st.st_size // INDEX_ENTRY.size, st.st_mtime))
+    return sorted(sessions, key=lambda s: -s.modified)
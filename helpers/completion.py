@@ -1,26 +1,25 @@
 import os
-import textwrap
-from typing import Generator
-from llama_index.llms.google_genai import GoogleGenAI
-from llama_index.core.llms import ChatMessage
-from rich.console import Console
+import time
+from typing import Callable, Dict, Generator, List, Optional, Tuple
 
 from .os_detect import detect_shell
 from .i18n import _, set_language
 from .config import get_config
 from .error import KnownError
+from .cache import get_response_cache, make_cache_key, normalize_prompt
+from .llm import Message, get_llm, get_provider
+from .call_policy import get_call_policy
+from .render import StreamRenderer
+from .tracing import span, traced_stream
+from .semantic_index import Suggestion, get_semantic_index, get_similarity_threshold
+from .capabilities import get_capabilities
+from .intents import IntentMatch, get_intent_library, get_intent_threshold, record_lookup
+from .usage import CACHE, TEMPLATE, metered_stream, record_usage
+from . import prompts
+from .prompts import EXPLANATION_MARKER
 
 SHELL_CODE_EXCLUSIONS = ["```bash", "```sh", "```zsh", "```powershell", "```", ""]
 
-def get_gemini_llm(key: str, model: str) -> GoogleGenAI:
-    """Initializes and returns the Gemini LLM instance."""
-    if not key:
-        raise KnownError(
-            _("Please set your Google Gemini API key via `ai config set GOOGLE_API_KEY=<your_token>`")
-        )
-    # This is the updated, cleaner way to initialize the client.
-    return GoogleGenAI(model=model, api_key=key)
-
 def get_os_details() -> str:
     import platform
     return platform.system()
@@ -29,57 +28,353 @@ def get_shell_details() -> str:
     shell = detect_shell()
     return f"The target shell is {shell}"
 
+def _capabilities_enabled() -> bool:
+    return str(get_config().get("CAPABILITIES", True)).lower() == "true"
+
+def get_environment_details() -> str:
+    """The distro, tool flavors and which common tools are installed, from the capability index."""
+    if not _capabilities_enabled():
+        return ""
+    with span("capabilities"):
+        return get_capabilities().describe()
+
+def get_mentioned_tools(text: str) -> List[str]:
+    """Other installed programs the request names; they go in the request, not the shared prefix."""
+    if not _capabilities_enabled():
+        return []
+    with span("capabilities"):
+        return get_capabilities().mentioned(text)
+
+def _prompt_setup() -> Dict[str, str]:
+    """The values of a template's system prefix: the setup, nothing from the request."""
+    config = get_config()
+    set_language(config.get("LANGUAGE", "en"))
+    return {
+        "shell": get_shell_details(),
+        "os": get_os_details(),
+        "environment": get_environment_details(),
+        "language": _("Language"),
+    }
+
+# The template whose wording each kind of cached response depends on
+_CACHED_TEMPLATES = {"script": prompts.SCRIPT, "explanation": prompts.EXPLANATION}
+
+def _response_cache_key(kind: str, model: str, text: str) -> str:
+    """Keys a response on everything that shapes it: model, prompt version, shell, OS, installed tools, language and input."""
+    config = get_config()
+    language = config.get("LANGUAGE", "en")
+    # Scripts depend on the tools we told the model about
+    environment = get_environment_details() + " ".join(get_mentioned_tools(text)) if kind == "script" else ""
+    return make_cache_key(
+        kind, get_provider(config), model, _CACHED_TEMPLATES[kind].tag, detect_shell(), get_os_details(),
+        environment, language, normalize_prompt(text),
+    )
+
+def _index_context() -> str:
+    return f"{detect_shell()}|{get_os_details()}"
+
+def _remember_script(prompt: str, script: str):
+    """Records a freshly generated script so similar prompts can be answered from history."""
+    # The stub provider's canned replies are not worth suggesting
+    if script and get_similarity_threshold() > 0 and get_provider() != "stub":
+        with span("semantic record"):
+            get_semantic_index().add(prompt, script, _index_context())
+
+# Template lookups already made by this process, so each prompt counts once in the hit rate
+_template_matches: Dict[str, Optional[IntentMatch]] = {}
+
+def find_template_script(prompt: str) -> Optional[IntentMatch]:
+    """A script from the local template library when the prompt confidently matches one; no model call."""
+    threshold = get_intent_threshold()
+    if threshold <= 0:
+        return None
+    if prompt not in _template_matches:
+        with span("intent lookup"):
+            match = get_intent_library().match(prompt, detect_shell(), threshold)
+        record_lookup(prompt, match)
+        if match is not None:
+            record_usage("script", "", TEMPLATE, prompt, match.script)
+        _template_matches[prompt] = match
+    return _template_matches[prompt]
+
+# Cache lookups made by find_similar_script, handed to the generation that follows so each counts once
+_prefetched: Dict[str, Optional[str]] = {}
+
+def find_similar_script(prompt: str, model: str) -> Optional[Suggestion]:
+    """A script generated for a similar past prompt, unless this exact prompt is already cached or templated."""
+    threshold = get_similarity_threshold()
+    if threshold <= 0 or find_template_script(prompt) is not None:
+        return None
+    cache_key = _response_cache_key("script", model, prompt)
+    cached = _prefetched[cache_key] = _cache_get(cache_key, "script", model, prompt)
+    if cached is not None:
+        return None
+    with span("semantic lookup"):
+        return get_semantic_index().search(prompt, _index_context(), threshold)
+
+def _cache_get(cache_key: str, kind: str, model: str, text: str) -> Optional[str]:
+    """A cached response, recorded as a cache hit; a lookup already made by find_similar_script is reused."""
+    if cache_key in _prefetched:
+        return _prefetched.pop(cache_key)
+    start = time.perf_counter()
+    with span("cache lookup", kind=kind):
+        cached = get_response_cache().get(cache_key)
+    if cached is not None:
+        record_usage(kind, model, CACHE, text, cached, time.perf_counter() - start)
+    return cached
+
+def _replay_cached(text: str) -> Generator[str, None, None]:
+    yield text
+
+def _cache_stream(stream: Generator[str, None, None], cache_key: str, kind: str) -> Generator[str, None, None]:
+    """Passes a stream through, caching the full text once it has been read to the end."""
+    chunks = []
+    for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    get_response_cache().put(cache_key, kind, "".join(chunks))
+
+def _prompt_text(messages: List[Message]) -> str:
+    return "\n".join(m.content for m in messages)
+
 def generate_completion_stream(
-    prompt: str,
+    messages: List[Message],
     key: str,
     model: str,
+    operation: str = "script",
 ) -> Generator[str, None, None]:
-    """Generates a streaming completion from the Gemini API."""
+    """Generates a streaming completion from the configured provider, recorded in the usage ledger as `operation`."""
+    yield from metered_stream(operation, model, _prompt_text(messages), _completion_deltas(messages, key, model))
+
+def _completion_deltas(messages: List[Message], key: str, model: str) -> Generator[str, None, None]:
     try:
-        llm = get_gemini_llm(key, model)
-        response_stream = llm.stream_chat([ChatMessage(role="user", content=prompt)])
-        for r in response_stream:
+        with span("client"):
+            llm = get_llm(key, model)
+        response_stream = get_call_policy().stream(lambda: llm.stream_chat(messages))
+        for r in traced_stream("llm.stream", response_stream):
             yield r.delta
     except Exception as e:
-        raise KnownError(f"Error communicating with Google Gemini API: {e}")
+        raise KnownError(f"Error communicating with the {get_provider()} API: {e}")
+
+def _complete(llm, messages: List[Message], model: str, operation: str) -> str:
+    """A blocking completion under the call policy, with errors reported like the streaming ones."""
+    start = time.perf_counter()
+    text, error = "", True
+    try:
+        with span("llm.complete"):
+            text = get_call_policy().call(lambda: llm.chat(messages)).message.content
+        error = False
+        return text
+    except Exception as e:
+        raise KnownError(f"Error communicating with the {get_provider()} API: {e}")
+    finally:
+        record_usage(
+            operation, model, prompt=_prompt_text(messages), response=text,
+            latency=time.perf_counter() - start, error=error,
+        )
+
+def _script_messages(prompt: str, variant: str = "") -> List[Message]:
+    return prompts.render(
+        prompts.SCRIPT, **_prompt_setup(), tools=get_mentioned_tools(prompt), prompt=prompt, variant=variant
+    )
+
+def _revision_messages(prompt: str, code: str) -> List[Message]:
+    return prompts.render(
+        prompts.REVISION, **_prompt_setup(), tools=get_mentioned_tools(prompt + " " + code), prompt=prompt, code=code
+    )
+
+def _stream_stripped(stream: Generator[str, None, None]) -> Generator[str, None, None]:
+    """Strips code fences from a stream on the fly, yielding only non-empty text."""
+    stripper = CodeFenceStripper()
+    for chunk in stream:
+        text = stripper.feed(chunk)
+        if text:
+            yield text
+    text = stripper.finish()
+    if text:
+        yield text
 
 def get_script_and_info(prompt: str, key: str, model: str) -> str:
     """Generates just the shell script from a prompt."""
-    full_prompt = textwrap.dedent(f"""
-        Create a single line command that one can enter in a terminal and run, based on what is specified in the prompt.
-        {get_shell_details()}
-        Only reply with the single line command. It must be able to be directly run in the target shell. Do not include any other text, explanations, or code fences.
-        Make sure the command runs on the {get_os_details()} operating system.
-        The prompt is: {prompt}
-    """)
-    llm = get_gemini_llm(key, model)
-    response = llm.complete(full_prompt)
-    return strip_code_fences(response.text)
+    template = find_template_script(prompt)
+    if template is not None:
+        return template.script
+    cache = get_response_cache()
+    cache_key = _response_cache_key("script", model, prompt)
+    cached = _cache_get(cache_key, "script", model, prompt)
+    if cached is not None:
+        return cached
+
+    with span("client"):
+        llm = get_llm(key, model)
+    script = strip_code_fences(_complete(llm, _script_messages(prompt), model, "script"))
+    cache.put(cache_key, "script", script)
+    _remember_script(prompt, script)
+    return script
+
+def get_script_candidates(prompt: str, key: str, model: str, count: int) -> List[str]:
+    """
+    Generates `count` scripts concurrently. Every request after the first asks for a
+    different approach, so the candidates don't all come back the same.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with span("client"):
+        llm = get_llm(key, model)
+
+    def generate(index: int) -> str:
+        variant = f"Prefer a different approach or tool than the most obvious one (variant {index + 1})." if index else ""
+        return strip_code_fences(_complete(llm, _script_messages(prompt, variant), model, "script"))
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(generate, i) for i in range(count)]
+    scripts = []
+    errors = []
+    for future in futures:
+        try:
+            scripts.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    # A few failed requests are fine as long as one came back
+    if not scripts and errors:
+        raise errors[0]
+    return scripts
 
 def get_explanation(script: str, key: str, model: str) -> Generator[str, None, None]:
     """Generates an explanation for a given script."""
-    config = get_config()
-    set_language(config.get("LANGUAGE", "en"))
+    cache_key = _response_cache_key("explanation", model, script)
+    cached = _cache_get(cache_key, "explanation", model, script)
+    if cached is not None:
+        return _replay_cached(cached)
+    messages = prompts.render(prompts.EXPLANATION, **_prompt_setup(), script=script)
+    return _cache_stream(generate_completion_stream(messages, key, model, "explanation"), cache_key, "explanation")
+
+def stream_script_and_info(prompt: str, key: str, model: str) -> Generator[str, None, None]:
+    """Streams the shell script for a prompt as it is generated, code fences already stripped."""
+    template = find_template_script(prompt)
+    if template is not None:
+        yield template.script
+        return
+    cache = get_response_cache()
+    cache_key = _response_cache_key("script", model, prompt)
+    cached = _cache_get(cache_key, "script", model, prompt)
+    if cached is not None:
+        yield cached
+        return
 
-    prompt = textwrap.dedent(f"""
-        Please provide a clear, concise description of the following script, using minimal words. Outline the steps in a list format.
-        Please reply in the user's language: {_('Language')}
-        The script is: {script}
-    """)
-    return generate_completion_stream(prompt, key, model)
-
-def get_revision(prompt: str, code: str, key: str, model: str) -> str:
-    """Generates a revised script based on user feedback."""
-    full_prompt = textwrap.dedent(f"""
-        Update the following script based on what is asked in the following prompt.
-        The script: {code}
-        The prompt: {prompt}
-        {get_shell_details()}
-        Only reply with the single line command. It must be able to be directly run in the target shell. Do not include any other text, explanations, or code fences.
-    """)
-    llm = get_gemini_llm(key, model)
-    response = llm.complete(full_prompt)
-    return strip_code_fences(response.text)
+    parts = []
+    for text in _stream_stripped(generate_completion_stream(_script_messages(prompt), key, model)):
+        parts.append(text)
+        yield text
+    script = "".join(parts)
+    cache.put(cache_key, "script", script)
+    _remember_script(prompt, script)
+
+def _split_explanation_stream(
+    stream: Generator[str, None, None],
+    on_script_delta: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, Generator[str, None, None]]:
+    """
+    Reads a combined response up to EXPLANATION_MARKER and returns the text before it
+    along with a generator over the rest, which is still being streamed.
+    Fence-stripped pieces of the text before the marker are passed to `on_script_delta` as they arrive.
+    If the response ends without the marker, only its first line is the command and
+    the rest is taken as the explanation, so prose is never offered to run.
+    """
+    stripper = CodeFenceStripper()
+    head = ""
+    shown = 0
+    # Anything this close to the end might be the start of the marker
+    hold_back = len(EXPLANATION_MARKER) - 1
+    # The first line is shown as it streams; later lines wait until the marker shows they belong to the command
+    first_line: List[str] = []
+    held: List[str] = []
+
+    def show(text: str):
+        if not text:
+            return
+        if held:
+            held.append(text)
+            return
+        line, newline, more = text.partition("\n")
+        if line:
+            first_line.append(line)
+            if on_script_delta is not None:
+                on_script_delta(line)
+        if newline:
+            held.append(newline + more)
+
+    for chunk in stream:
+        head += chunk
+        if EXPLANATION_MARKER in head:
+            break
+        safe = max(shown, len(head) - hold_back)
+        show(stripper.feed(head[shown:safe]))
+        shown = safe
+    head, marker, tail = head.partition(EXPLANATION_MARKER)
+    show(stripper.feed(head[shown:]))
+    show(stripper.finish())
+
+    if marker:
+        if held and on_script_delta is not None:
+            on_script_delta("".join(held))
+    else:
+        head, tail = "".join(first_line), "".join(held)
+
+    def rest() -> Generator[str, None, None]:
+        pending = tail
+        for chunk in stream:
+            pending += chunk
+            # Skip the whitespace between the marker and the explanation itself
+            if pending.strip():
+                break
+        if pending.strip():
+            yield pending.lstrip()
+        yield from stream
+
+    return head, rest()
+
+def get_script_with_explanation(
+    prompt: str,
+    key: str,
+    model: str,
+    on_script_delta: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, Generator[str, None, None]]:
+    """
+    Generates the script and its explanation in one streamed request.
+    Returns as soon as the script is complete; the explanation keeps streaming from the generator.
+    """
+    template = find_template_script(prompt)
+    if template is not None:
+        if on_script_delta is not None:
+            on_script_delta(template.script)
+        return template.script, get_explanation(template.script, key, model)
+
+    script_key = _response_cache_key("script", model, prompt)
+    cache = get_response_cache()
+    script = _cache_get(script_key, "script", model, prompt)
+    if script is not None:
+        cached_explanation = _cache_get(_response_cache_key("explanation", model, script), "explanation", model, script)
+        if cached_explanation is not None:
+            if on_script_delta is not None:
+                on_script_delta(script)
+            return script, _replay_cached(cached_explanation)
+
+    messages = prompts.render(
+        prompts.SCRIPT_WITH_EXPLANATION, **_prompt_setup(), tools=get_mentioned_tools(prompt), prompt=prompt
+    )
+    head, explanation_stream = _split_explanation_stream(
+        generate_completion_stream(messages, key, model), on_script_delta
+    )
+    script = strip_code_fences(head)
+    cache.put(script_key, "script", script)
+    _remember_script(prompt, script)
+    explanation_key = _response_cache_key("explanation", model, script)
+    return script, _cache_stream(explanation_stream, explanation_key, "explanation")
+
+def stream_revision(prompt: str, code: str, key: str, model: str) -> Generator[str, None, None]:
+    """Streams a revised script as it is generated, code fences already stripped."""
+    yield from _stream_stripped(generate_completion_stream(_revision_messages(prompt, code), key, model, "revision"))
 
 def strip_code_fences(text: str) -> str:
     """Removes markdown code fences from a string."""
@@ -88,12 +383,71 @@ def strip_code_fences(text: str) -> str:
     filtered_lines = [line for line in lines if not line.strip().startswith("```")]
     return "\n".join(filtered_lines).strip()
 
+class CodeFenceStripper:
+    """
+    Incremental strip_code_fences(): feed() chunks as they stream in and get back
+    the text that is safe to show. Everything returned by feed() and finish(),
+    concatenated, equals strip_code_fences() of the whole text.
+    """
+
+    def __init__(self):
+        self._line = ""         # current line while we can't tell if it's a fence yet
+        self._keep = None       # None until the current line is known to be a fence or not
+        self._kept_lines = 0
+        self._started = False   # emitted anything but leading whitespace
+        self._pending = ""      # whitespace held back in case it turns out to be trailing
+
+    def feed(self, chunk: str) -> str:
+        out = []
+        while chunk:
+            part, newline, chunk = chunk.partition("\n")
+            out.append(self._feed_line(part))
+            if newline:
+                out.append(self._end_line())
+        return "".join(out)
 
-def read_stream_and_print(stream: Generator[str, None, None]) -> str:
+    def finish(self) -> str:
+        """Flushes the last line; trailing whitespace is dropped."""
+        return self._end_line()
+
+    def _feed_line(self, part: str) -> str:
+        if self._keep is None:
+            self._line += part
+            head = self._line.lstrip()
+            # The first three non-blank characters settle whether this is a fence line
+            if len(head) >= 3 or any(c != "`" for c in head):
+                self._keep = not head.startswith("```")
+                if self._keep:
+                    return self._open_line(self._line)
+            return ""
+        return self._emit(part) if self._keep else ""
+
+    def _end_line(self) -> str:
+        out = self._open_line(self._line) if self._keep is None else ""
+        self._line = ""
+        self._keep = None
+        return out
+
+    def _open_line(self, text: str) -> str:
+        separator = "\n" if self._kept_lines else ""
+        self._kept_lines += 1
+        return self._emit(separator + text)
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        text = self._pending + text
+        body = text.rstrip()
+        self._pending = text[len(body):]
+        return body
+
+
+def read_stream_and_print(stream: Generator[str, None, None], markdown: bool = False) -> str:
     """Reads a generator stream, prints it to the console, and returns the full string."""
-    full_response = ""
-    console = Console()
-    for chunk in stream:
-        print(chunk, end="", flush=True)
-        full_response += chunk
-    return full_response
+    with StreamRenderer(markdown=markdown) as renderer:
+        for chunk in traced_stream("render", stream):
+            renderer.write(chunk)
+    return renderer.text
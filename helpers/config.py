@@ -1,50 +1,163 @@
 import json
+import os
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 from .i18n import _
 from .error import KnownError
 
 CONFIG_PATH = Path.home() / ".ai_shell_config.json"
 DEFAULT_CONFIG = {
+    # Model backend: gemini, openai (any OpenAI-compatible server) or stub (offline, for benchmarks)
+    "PROVIDER": "gemini",
     "GOOGLE_API_KEY": None,
     "MODEL": "gemini-1.5-flash",
+    "OPENAI_BASE_URL": "http://localhost:8080/v1",
+    "OPENAI_API_KEY": None,
+    # Stub provider: seconds to first token, tokens per second and share of requests that fail
+    "STUB_LATENCY": 0.3,
+    "STUB_TOKENS_PER_SECOND": 200,
+    "STUB_FAILURE_RATE": 0.0,
+    # Estimated tokens of chat history resent per message before old turns get summarized
+    "CHAT_TOKEN_BUDGET": 4000,
     "SILENT_MODE": False,
     "LANGUAGE": "en",
+    # Render explanations as Markdown while they stream, where nothing else is drawing on the terminal
+    "MARKDOWN": False,
+    # Response cache: seconds an entry stays valid (0 disables) and max entries kept
+    "CACHE_TTL": 7 * 24 * 60 * 60,
+    "CACHE_MAX_ENTRIES": 1000,
+    # Model calls: seconds for a whole call and for its first token, and retries on 429/5xx/timeouts
+    "CALL_TIMEOUT": 120,
+    "FIRST_TOKEN_TIMEOUT": 30,
+    "CALL_RETRIES": 2,
+    # Race a duplicate request against one slower than HEDGE_AFTER seconds (the recent p95 once known)
+    "HEDGE_REQUESTS": False,
+    "HEDGE_AFTER": 3.0,
+    # Similarity (0-1) a past prompt needs for its command to be suggested; 0 disables suggestions
+    "SEMANTIC_THRESHOLD": 0.8,
+    # Score (0-1) a prompt needs to be answered from the local template library without a model call; 0 disables
+    "INTENT_THRESHOLD": 0.85,
+    # Record each model call (latency, tokens, cache hits) in a local ledger for `ai stats`
+    "USAGE_LEDGER": True,
+    # Tell the model which tools are installed and their flavors (GNU/BSD), from an index of PATH
+    "CAPABILITIES": True,
+    # Upload the fixed part of our prompts once as a provider-side cached context (Gemini), instead of resending it
+    "CONTEXT_CACHE": False,
 }
 
-def get_config() -> Dict[str, Any]:
-    """Reads the config file and returns it, creating one if it doesn't exist."""
-    if not CONFIG_PATH.exists():
-        with open(CONFIG_PATH, "w") as f:
-            json.dump(DEFAULT_CONFIG, f, indent=2)
-        return DEFAULT_CONFIG
-    
+# Any config key can be overridden for a single run, e.g. AI_SHELL_MODEL=gemini-pro
+ENV_PREFIX = "AI_SHELL_"
+
+# Parsed config file, reused until the file's stat signature changes
+_cached_config: Optional[Dict[str, Any]] = None
+_cached_stamp: Optional[Tuple[int, int, int]] = None
+
+def _coerce(value: str) -> Any:
+    """Coerces boolean strings to booleans."""
+    if value.lower() in ["true", "false"]:
+        return value.lower() == "true"
+    return value
+
+def _file_stamp() -> Optional[Tuple[int, int, int]]:
+    try:
+        st = CONFIG_PATH.stat()
+    except FileNotFoundError:
+        return None
+    # os.replace() gives the file a new inode, so atomic writes always change the stamp
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+@contextmanager
+def _config_lock():
+    """Serializes config writers across processes (best effort where flock is unavailable)."""
+    lock_path = CONFIG_PATH.with_name(CONFIG_PATH.name + ".lock")
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _read_config_file() -> Dict[str, Any]:
     with open(CONFIG_PATH, "r") as f:
         try:
             config = json.load(f)
-            # Ensure all default keys exist
-            for key, value in DEFAULT_CONFIG.items():
-                if key not in config:
-                    config[key] = value
-            return config
         except json.JSONDecodeError:
             raise KnownError(f"Error reading config file at {CONFIG_PATH}. It might be corrupted.")
+    # Ensure all default keys exist
+    for key, value in DEFAULT_CONFIG.items():
+        if key not in config:
+            config[key] = value
+    return config
+
+def _write_config_file(config: Dict[str, Any]):
+    """Writes the config atomically: readers see either the old file or the new one, never half of it."""
+    fd, tmp_path = tempfile.mkstemp(dir=CONFIG_PATH.parent, prefix=CONFIG_PATH.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(config, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CONFIG_PATH)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def _load_file_config() -> Dict[str, Any]:
+    """The config file's contents, re-parsed only when the file has changed."""
+    global _cached_config, _cached_stamp
+    stamp = _file_stamp()
+    if stamp is None:
+        with _config_lock():
+            if not CONFIG_PATH.exists():
+                _write_config_file(DEFAULT_CONFIG)
+        stamp = _file_stamp()
+    if stamp != _cached_stamp or _cached_config is None:
+        _cached_config = _read_config_file()
+        _cached_stamp = stamp
+    return _cached_config
+
+def _env_overrides() -> Dict[str, Any]:
+    overrides = {}
+    for key in DEFAULT_CONFIG:
+        value = os.environ.get(ENV_PREFIX + key)
+        if value is not None:
+            overrides[key] = _coerce(value)
+    return overrides
+
+def get_config() -> Dict[str, Any]:
+    """
+    Returns the config, creating the file if it doesn't exist. The parsed file is
+    cached in-process and AI_SHELL_<KEY> environment variables take precedence.
+    """
+    config = dict(_load_file_config())
+    config.update(_env_overrides())
+    return config
 
 def set_configs(key_values: List[Tuple[str, str]]):
     """Sets one or more configuration values."""
-    config = get_config()
+    global _cached_config, _cached_stamp
+    updates = {}
     for key, value in key_values:
         if key.upper() not in DEFAULT_CONFIG:
             raise KnownError(f"{_('Invalid config property')}: {key}")
-        
-        # Coerce boolean strings to booleans
-        if value.lower() in ["true", "false"]:
-            config[key.upper()] = value.lower() == "true"
-        else:
-            config[key.upper()] = value
-
-    with open(CONFIG_PATH, "w") as f:
-        json.dump(config, f, indent=2)
+        updates[key.upper()] = _coerce(value)
+
+    # Read-modify-write under the lock so concurrent `ai config set` calls don't lose updates
+    with _config_lock():
+        config = _read_config_file() if CONFIG_PATH.exists() else dict(DEFAULT_CONFIG)
+        config.update(updates)
+        _write_config_file(config)
+        _cached_config = config
+        _cached_stamp = _file_stamp()
 
 def has_own(obj: Dict, key: str) -> bool:
     """Checks if a key exists in a dictionary."""
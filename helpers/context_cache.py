@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+CONTEXTS_PATH = Path.home() / ".ai_shell_contexts.json"
+# Seconds a provider keeps a cached context; each one is billed for storage while it lives
+CONTEXT_TTL = 3600
+# A context this close to expiring is not used: it could expire mid-request
+EXPIRY_MARGIN = 300
+
+
+class ContextCache:
+    """
+    Names of provider-side cached contexts: a system prefix uploaded once, so later
+    requests send only their suffix and the provider skips re-reading the prefix.
+    Keyed by provider, model and prefix text. Names are kept in a small JSON file
+    (or only in memory when `path` is None) so short-lived CLI processes reuse
+    contexts created by earlier ones instead of paying for a new one each run.
+    """
+
+    def __init__(self, path: Optional[Path], min_tokens: int = 0):
+        self.path = path
+        # Providers refuse to cache prefixes shorter than this
+        self.min_tokens = min_tokens
+        self.contexts: Dict[str, Tuple[str, float]] = {}
+        # Prefixes the provider refused to cache; not retried by this process
+        self._refused = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        self._loaded = True
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.contexts = {key: (name, expires) for key, (name, expires) in data.items()}
+
+    def _save(self):
+        if self.path is None:
+            return
+        now = time.time()
+        data = {key: context for key, context in self.contexts.items() if context[1] > now}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def get(self, scope: str, prefix: str, create: Callable[[str, int], str]) -> Optional[str]:
+        """
+        The name of a live context holding `prefix`, created with `create(prefix, ttl)`
+        if there is none. None when the prefix can't be cached.
+        """
+        from .chat_history import estimate_tokens
+        key = hashlib.sha256(f"{scope}\n{prefix}".encode("utf-8")).hexdigest()
+        # Held while creating, so concurrent requests wait for one context instead of each making their own
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if key in self._refused:
+                return None
+            context = self.contexts.get(key)
+            if context is not None and context[1] - EXPIRY_MARGIN > time.time():
+                return context[0]
+            if estimate_tokens(prefix) < self.min_tokens:
+                self._refused.add(key)
+                return None
+            try:
+                name = create(prefix, CONTEXT_TTL)
+            except Exception:
+                self._refused.add(key)
+                return None
+            self.contexts[key] = (name, time.time() + CONTEXT_TTL)
+            self._save()
+            return name
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Generator, Optional, Tuple
+
+from .constants import __version__
+
+SOCKET_PATH = Path.home() / ".ai_shell_daemon.sock"
+LOG_PATH = Path.home() / ".ai_shell_daemon.log"
+# Set to skip the daemon for a single run
+DISABLE_ENV = "AI_SHELL_NO_DAEMON"
+
+_available: Optional[bool] = None
+
+
+def disable_daemon():
+    """Makes this process talk to the model directly, even if a daemon is running."""
+    global _available
+    _available = False
+
+
+def daemon_available() -> bool:
+    """Whether a daemon is answering on SOCKET_PATH (checked once per process)."""
+    global _available
+    if _available is None:
+        _available = (
+            not os.environ.get(DISABLE_ENV)
+            and hasattr(socket, "AF_UNIX")
+            and SOCKET_PATH.exists()
+            and _connect(timeout=0.05) is not None
+        )
+    return _available
+
+
+def _connect(timeout: Optional[float] = None) -> Optional[socket.socket]:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(SOCKET_PATH))
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def _request(payload: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+    """Sends one request and yields the daemon's JSON replies until the last one."""
+    sock = _connect(timeout=1)
+    if sock is None:
+        raise ConnectionError(f"AI Shell daemon is not running at {SOCKET_PATH}")
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps(payload).encode("utf-8") + b"\n")
+        stream.flush()
+        for line in stream:
+            reply = json.loads(line)
+            if "error" in reply:
+                raise Exception(reply["error"])
+            yield reply
+            if reply.get("done"):
+                return
+
+
+def call_daemon(op: str, **kwargs) -> Dict[str, Any]:
+    """Sends a single request/response call to the daemon."""
+    return next(_request({"op": op, **kwargs}))
+
+
+def _dump_messages(messages) -> list:
+    return [{"role": str(getattr(m.role, "value", m.role)), "content": m.content} for m in messages]
+
+
+class RemoteLLM:
+    """Same interface as the in-process providers, served by the daemon over its Unix socket."""
+
+    def __init__(self, provider: str, key: str, model: str, settings: Tuple[Tuple[str, str], ...] = ()):
+        self.provider = provider
+        self.key = key
+        self.model = model
+        # The caller's client settings, so its config and AI_SHELL_* overrides apply rather than the daemon's
+        self.settings = settings
+
+    def _payload(self, op: str, **kwargs) -> Dict[str, Any]:
+        return {
+            "op": op, "provider": self.provider, "key": self.key, "model": self.model,
+            "settings": dict(self.settings), **kwargs,
+        }
+
+    def complete(self, prompt: str):
+        reply = next(_request(self._payload("complete", prompt=prompt)))
+        return SimpleNamespace(text=reply["text"])
+
+    def chat(self, messages):
+        reply = next(_request(self._payload("chat", messages=_dump_messages(messages))))
+        return SimpleNamespace(message=SimpleNamespace(role="assistant", content=reply["content"]))
+
+    def stream_chat(self, messages):
+        for reply in _request(self._payload("stream_chat", messages=_dump_messages(messages))):
+            if "delta" in reply:
+                yield SimpleNamespace(delta=reply["delta"])
+
+    async def achat(self, messages):
+        return await asyncio.to_thread(self.chat, messages)
+
+    async def astream_chat(self, messages):
+        reader, writer = await asyncio.open_unix_connection(str(SOCKET_PATH))
+        payload = self._payload("stream_chat", messages=_dump_messages(messages))
+        writer.write(json.dumps(payload).encode("utf-8") + b"\n")
+        await writer.drain()
+
+        async def deltas():
+            # Closing the connection (e.g. on cancel) makes the daemon stop streaming
+            try:
+                while line := await reader.readline():
+                    reply = json.loads(line)
+                    if "error" in reply:
+                        raise Exception(reply["error"])
+                    if reply.get("done"):
+                        return
+                    yield SimpleNamespace(delta=reply["delta"])
+            finally:
+                writer.close()
+
+        return deltas()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _send(self, **reply):
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        from .config import get_config
+        from .llm import Message, client_settings, get_llm
+
+        try:
+            request = json.loads(self.rfile.readline())
+            op = request.get("op")
+            if op == "ping":
+                self._send(pid=os.getpid(), version=__version__, done=True)
+                return
+            if op == "shutdown":
+                self._send(done=True)
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+            # The daemon itself always uses the in-process client pool, with a client per caller setup;
+            # settings the request leaves out come from the daemon's own config
+            config = get_config()
+            config.update(request.get("settings", {}))
+            llm = get_llm(request["key"], request["model"], request.get("provider"), client_settings(config))
+            messages = [Message(**m) for m in request.get("messages", [])]
+            if op == "complete":
+                self._send(text=llm.complete(request["prompt"]).text, done=True)
+            elif op == "chat":
+                self._send(content=llm.chat(messages).message.content, done=True)
+            elif op == "stream_chat":
+                for r in llm.stream_chat(messages):
+                    self._send(delta=r.delta)
+                self._send(done=True)
+            else:
+                self._send(error=f"Unknown daemon operation: {op}")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away (e.g. a cancelled chat reply)
+            pass
+        except Exception as e:
+            try:
+                self._send(error=str(e))
+            except OSError:
+                pass
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path):
+        super().__init__(str(path), _Handler)
+
+
+def serve():
+    """Runs the daemon in the foreground until it receives SIGTERM or a shutdown request."""
+    from .config import get_config
+    from .i18n import set_language
+    from .error import KnownError
+    from .llm import get_api_key, get_llm, get_provider
+
+    disable_daemon()
+    if SOCKET_PATH.exists():
+        if _connect(timeout=0.1) is not None:
+            raise RuntimeError(f"An AI Shell daemon is already running at {SOCKET_PATH}")
+        SOCKET_PATH.unlink()
+
+    # Only the current user may talk to the daemon: requests carry their API key
+    old_umask = os.umask(0o177)
+    try:
+        server = DaemonServer(SOCKET_PATH)
+    finally:
+        os.umask(old_umask)
+
+    # Warm everything a request would otherwise pay for
+    config = get_config()
+    set_language(config.get("LANGUAGE", "en"))
+    try:
+        get_llm(get_api_key(config), config.get("MODEL", "gemini-1.5-flash"))
+    except KnownError:
+        # No key yet: at least have the client library loaded
+        if get_provider(config) == "gemini":
+            import llama_index.llms.google_genai  # noqa: F401
+
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if SOCKET_PATH.exists():
+            SOCKET_PATH.unlink()
+
+
+def start_daemon(timeout: float = 30) -> Optional[Dict[str, Any]]:
+    """Starts the daemon in the background and waits until it answers. Returns its ping reply."""
+    package_root = Path(__file__).resolve().parent.parent
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(package_root), os.environ.get("PYTHONPATH")])))
+    with open(LOG_PATH, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, "-c", "from helpers.daemon import serve; serve()"],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, env=env, start_new_session=True,
+        )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if SOCKET_PATH.exists():
+            try:
+                return call_daemon("ping")
+            except (ConnectionError, OSError):
+                pass
+        time.sleep(0.1)
+    return None
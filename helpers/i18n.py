@@ -1,23 +1,83 @@
 import json
+import marshal
 import os
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 _translations = {}
 _current_lang = "en"
+# Parsed catalogs by language, so switching back and forth never re-reads a file
+_catalogs: Dict[str, Dict[str, str]] = {}
+# Languages without a catalog, so falling back to English doesn't retry the load on every call
+_missing = set()
 
 # Path to the locales directory inside the package
 _locales_path = Path(__file__).parent.parent / 'locales'
+# Compiled catalogs live next to the sources, the way .pyc files do
+_compiled_path = _locales_path / '__pycache__'
+
+
+def _source_stamp(source: Path) -> Tuple[int, int]:
+    st = source.stat()
+    return (st.st_mtime_ns, st.st_size)
+
+
+def compile_catalog(lang: str) -> Dict[str, str]:
+    """Parses locales/<lang>.json and writes its marshalled form for faster loads later."""
+    source = _locales_path / f'{lang}.json'
+    with open(source, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    try:
+        _compiled_path.mkdir(exist_ok=True)
+        tmp_path = _compiled_path / f'{lang}.catalog.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            marshal.dump((_source_stamp(source), catalog), f)
+        os.replace(tmp_path, _compiled_path / f'{lang}.catalog')
+    except OSError:
+        # Read-only install: keep using the JSON
+        pass
+    return catalog
+
+
+def _load_compiled(lang: str) -> Optional[Dict[str, str]]:
+    try:
+        with open(_compiled_path / f'{lang}.catalog', 'rb') as f:
+            stamp, catalog = marshal.load(f)
+        # Stale if the JSON changed since it was compiled
+        if tuple(stamp) == _source_stamp(_locales_path / f'{lang}.json'):
+            return catalog
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    return None
+
+
+def load_catalog(lang: str) -> Dict[str, str]:
+    """
+    The catalog for a language: from memory, the compiled file or the JSON, in that order.
+    The first load compiles the catalog, so the JSON is only parsed on first run.
+    """
+    catalog = _catalogs.get(lang)
+    if catalog is None:
+        catalog = _load_compiled(lang)
+        if catalog is None:
+            catalog = compile_catalog(lang)
+        _catalogs[lang] = catalog
+    return catalog
+
 
 def set_language(lang: str = "en"):
     """Sets the language for the application."""
     global _current_lang, _translations
-    _current_lang = lang if lang else "en"
+    lang = lang if lang and lang not in _missing else "en"
+    if lang == _current_lang:
+        return
+    _current_lang = lang
     if _current_lang != "en":
         try:
-            with open(_locales_path / f'{_current_lang}.json', 'r', encoding='utf-8') as f:
-                _translations = json.load(f)
+            _translations = load_catalog(_current_lang)
         except FileNotFoundError:
             # Fallback to English if translation file doesn't exist
+            _missing.add(lang)
             _translations = {}
             _current_lang = "en"
 
@@ -27,5 +87,25 @@ def _(key: str) -> str:
         return key
     return _translations.get(key, key)
 
-# Initialize with English
-set_language("en")
\ No newline at end of file
+
+class LazyText:
+    """A translatable string resolved when it is rendered, not when it is defined."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __str__(self) -> str:
+        return _(self.key)
+
+    def __format__(self, spec: str) -> str:
+        return format(str(self), spec)
+
+    def __repr__(self) -> str:
+        return f"LazyText({self.key!r})"
+
+
+def lazy_(key: str) -> LazyText:
+    """Marks a module-level string for translation at render time."""
+    return LazyText(key)
@@ -0,0 +1,411 @@
+import json
+import logging
+import marshal
+import os
+import re
+import shlex
+import threading
+from collections import Counter
+from importlib import resources
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .config import get_config, DEFAULT_CONFIG
+
+# Shipped templates, and the user's own (same format; an intent with the same id replaces the shipped one)
+LIBRARY_PATH = Path(str(resources.files(__package__) / "intent_library.json"))
+USER_LIBRARY_PATH = Path.home() / ".ai_shell_intents.json"
+# Both libraries compiled into one lookup index, rebuilt when either changes
+INDEX_PATH = Path.home() / ".ai_shell_intents.index"
+STATS_PATH = Path.home() / ".ai_shell_intent_stats.json"
+INDEX_VERSION = 3
+
+# Shells that run the "posix" commands of a template
+POSIX_SHELLS = {"bash", "sh", "zsh", "dash", "ksh"}
+# Patterns tried per prompt, best trigram overlap first
+MAX_CANDIDATES = 10
+# Extra words tolerated between and after a pattern's words; each one lowers the score
+MAX_GAP = 2
+# Missed prompts kept in the stats, to see which intents are worth adding
+MAX_MISSES = 200
+
+logger = logging.getLogger(__name__)
+
+FILLER_WORDS = {"please", "me", "the", "all", "every", "a", "an", "my", "some", "any", "can", "could", "you", "just"}
+# Phrases saying how deep to look; a template only answers them if its command has that scope
+SCOPE_PHRASES = {
+    "recursive": re.compile(
+        r"\b(?:recursive(?:ly)?|(?:in|and|including) (?:all )?sub-?(?:directories|directory|folders?|dirs?)"
+        r"|under (?:the )?(?:current|this|working) (?:directory|folder|dir))\b",
+        re.IGNORECASE,
+    ),
+    "directory": re.compile(
+        r"\b(?:(?:in|from|inside) (?:the )?(?:current|this|working) (?:directory|folder|dir)|here|top[- ]level)\b",
+        re.IGNORECASE,
+    ),
+}
+# Words that change what is asked ("don't delete", "all but", "only if"); such prompts go to the model
+QUALIFIER_WORDS = {
+    "not", "no", "never", "dont", "undo", "revert", "restore", "except", "but", "only", "without",
+    "unless", "exclude", "excluding", "ignore", "ignoring", "skip", "skipping", "besides", "instead", "if",
+}
+# Commands that delete or stop things; their templates only answer prompts that match a pattern exactly
+DESTRUCTIVE = re.compile(
+    r"(?:^|[\s|;&(])(?:rm|rmdir|shred|kill|pkill|killall|truncate|dd|mkfs\S*|Remove-Item|Stop-Process)(?:\s|$)"
+    r"|-delete\b|git (?:reset --hard|clean|push --force)",
+    re.IGNORECASE,
+)
+SYNONYMS = {
+    "remove": "delete", "erase": "delete", "rm": "delete",
+    "show": "list", "display": "list", "print": "list", "get": "list",
+    "folder": "directory", "dir": "directory",
+    "biggest": "largest",
+}
+EXTENSION_ALIASES = {
+    "javascript": "js", "typescript": "ts", "python": "py", "markdown": "md", "text": "txt",
+    "ruby": "rb", "rust": "rs", "golang": "go", "yaml": "yml", "shell": "sh", "image": "png",
+}
+# Bare words taken as an extension ("log files"); anything else needs a dot (".old files")
+KNOWN_EXTENSIONS = {
+    "log", "txt", "md", "json", "yml", "yaml", "toml", "ini", "cfg", "conf", "csv", "xml", "html", "css",
+    "js", "jsx", "ts", "tsx", "py", "pyc", "rb", "go", "rs", "java", "class", "c", "h", "cpp", "php", "sh", "sql",
+    "tmp", "bak", "swp", "orig", "rej", "pdf", "png", "jpg", "jpeg", "gif", "svg", "mp3", "mp4", "mov", "wav",
+    "zip", "gz", "tgz", "tar", "docx", "xlsx", "o", "so", "lock",
+}
+# How a slot's value may look, and whether it is quoted when put in a command
+SLOT_TYPES = {
+    "ext": (re.compile(r"^\*?\.?[A-Za-z0-9_+-]{1,12}$"), False),
+    "number": (re.compile(r"^\d{1,6}$"), False),
+    "path": (re.compile(r"^[\w./~*@:+-]+$"), True),
+    "text": (re.compile(r"^[^\x00-\x1f]{1,200}$"), True),
+}
+SLOT = re.compile(r"\{(\w+)\}")
+TOKEN = re.compile(r"\"[^\"]+\"|'[^']+'|\S+")
+
+
+class IntentMatch(NamedTuple):
+    intent: str
+    script: str
+    score: float
+
+
+def _normalize_word(word: str) -> str:
+    word = SYNONYMS.get(word, word)
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "ches", "shes", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def _tokens(text: str) -> List[Tuple[str, str]]:
+    """(normalized, as written) pairs for the words that carry meaning."""
+    tokens = []
+    for original in TOKEN.findall(text):
+        if original[0] in "\"'" and original[-1] == original[0]:
+            # A quoted phrase is one token, kept as written
+            value = original[1:-1]
+            tokens.append((value.lower().replace(" ", "_"), value))
+            continue
+        word = original.strip(",;:!?()")
+        if word and word.lower() not in FILLER_WORDS:
+            tokens.append((_normalize_word(word.lower()), word))
+    return tokens
+
+
+def _trigrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _similarity(a: str, b: str) -> float:
+    """Dice coefficient over character trigrams."""
+    ta, tb = _trigrams(a), _trigrams(b)
+    total = sum(ta.values()) + sum(tb.values())
+    return 2 * sum((ta & tb).values()) / total if total else 0.0
+
+
+def _pattern_regex(words: List[str]) -> str:
+    """
+    Matches a pattern's words in order over space-joined tokens, allowing a few extra tokens
+    between and after them. The prompt must start with the pattern's first word, so a
+    leading qualifier can't be skipped over.
+    """
+    gap = f"(?:\\S+ ){{0,{MAX_GAP}}}?"
+    parts = []
+    for word in words:
+        slot = SLOT.fullmatch(word)
+        parts.append(f"(?P<{slot.group(1)}>\\S+)" if slot else re.escape(word))
+    return "^" + f" {gap}".join(parts) + f"(?: \\S+){{0,{MAX_GAP}}}$"
+
+
+def _read_library(path: Path) -> List[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("intents", [])
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, AttributeError):
+        # A broken user library shouldn't break prompting; the shipped one still works
+        return []
+
+
+def _destructive(commands: Dict[str, object]) -> bool:
+    return any(
+        DESTRUCTIVE.search(command)
+        for options in commands.values()
+        for command in ([options] if isinstance(options, str) else options)
+    )
+
+
+def _has_qualifier(prompt: str) -> bool:
+    words = re.findall(r"[a-z']+", prompt.lower())
+    return any(word.replace("'", "") in QUALIFIER_WORDS or word.endswith("n't") for word in words)
+
+
+def _scope(prompt: str) -> Tuple[str, Optional[str]]:
+    """The prompt without its scope phrases, and the scope they ask for ("mixed" if they disagree)."""
+    scopes = set()
+    for scope, phrases in SCOPE_PHRASES.items():
+        prompt, count = phrases.subn(" ", prompt)
+        if count:
+            scopes.add(scope)
+    if len(scopes) > 1:
+        return prompt, "mixed"
+    return prompt, scopes.pop() if scopes else None
+
+
+def _stamp(paths: List[Path]) -> List[Tuple[str, int, int]]:
+    stamp = []
+    for path in paths:
+        try:
+            st = path.stat()
+            stamp.append((str(path), st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((str(path), 0, 0))
+    return stamp
+
+
+def compile_library(sources: List[Path]) -> dict:
+    """
+    Builds the lookup index: every pattern as a token regex, plus an inverted
+    index from character trigrams to the patterns containing them.
+    """
+    intents: Dict[str, dict] = {}
+    for source in sources:
+        for intent in _read_library(source):
+            if intent.get("id") and intent.get("patterns") and intent.get("commands"):
+                intents[intent["id"]] = intent
+
+    patterns = []
+    trigrams: Dict[str, List[int]] = {}
+    for intent in intents.values():
+        for pattern in intent["patterns"]:
+            words = [w if SLOT.fullmatch(w) else norm for norm, w in _tokens(pattern)]
+            literal = " ".join(w for w in words if not SLOT.fullmatch(w))
+            index = len(patterns)
+            patterns.append({"intent": intent["id"], "regex": _pattern_regex(words), "text": " ".join(words)})
+            for trigram in _trigrams(literal):
+                trigrams.setdefault(trigram, []).append(index)
+
+    compiled_intents = {
+        intent_id: {
+            "slots": intent.get("slots", {}),
+            "commands": intent["commands"],
+            "destructive": _destructive(intent["commands"]),
+            "scope": intent.get("scope"),
+        }
+        for intent_id, intent in intents.items()
+    }
+    return {"intents": compiled_intents, "patterns": patterns, "trigrams": trigrams}
+
+
+class IntentLibrary:
+    """The compiled shipped + user libraries, loaded from the marshalled index when it is current."""
+
+    def __init__(self, sources: List[Path], index_path: Path = INDEX_PATH):
+        self.sources = sources
+        self.index_path = index_path
+        self._regexes: Dict[int, "re.Pattern"] = {}
+        self.data = self._load()
+
+    def _load(self) -> dict:
+        stamp = _stamp(self.sources)
+        try:
+            with open(self.index_path, "rb") as f:
+                version, stored_stamp, data = marshal.load(f)
+            if version == INDEX_VERSION and [tuple(s) for s in stored_stamp] == stamp:
+                return data
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        data = compile_library(self.sources)
+        try:
+            tmp_path = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                marshal.dump((INDEX_VERSION, stamp, data), f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass
+        return data
+
+    def __len__(self) -> int:
+        return len(self.data["intents"])
+
+    def supports(self, intent_id: str, shell: str) -> bool:
+        commands = self.data["intents"][intent_id]["commands"]
+        return shell in commands or ("posix" in commands and shell in POSIX_SHELLS)
+
+    def _candidates(self, text: str) -> List[int]:
+        overlap: Counter = Counter()
+        trigram_index = self.data["trigrams"]
+        for trigram in _trigrams(text):
+            for index in trigram_index.get(trigram, ()):
+                overlap[index] += 1
+        return [index for index, _count in overlap.most_common(MAX_CANDIDATES)]
+
+    def _regex(self, index: int) -> "re.Pattern":
+        regex = self._regexes.get(index)
+        if regex is None:
+            regex = self._regexes[index] = re.compile(self.data["patterns"][index]["regex"])
+        return regex
+
+    def match(self, prompt: str, shell: str, threshold: float) -> Optional[IntentMatch]:
+        """The best template answer for the prompt in this shell, if it scores at least `threshold`."""
+        unscoped, scope = _scope(prompt)
+        tokens = _tokens(unscoped)
+        if not tokens or _has_qualifier(prompt):
+            return None
+        normalized = [norm for norm, _original in tokens]
+        text = " ".join(normalized)
+
+        best: Optional[IntentMatch] = None
+        for index in self._candidates(text):
+            pattern = self.data["patterns"][index]
+            intent = self.data["intents"][pattern["intent"]]
+            # "in this directory" or "recursively" must agree with what the command does
+            if scope is not None and intent["scope"] != scope:
+                continue
+            found = self._regex(index).match(text)
+            if found is None:
+                continue
+            # Score the prompt with its slot values masked, so only the template's own words count
+            masked = list(normalized)
+            values = {}
+            for name in found.groupdict():
+                position = text.count(" ", 0, found.start(name))
+                masked[position] = "{" + name + "}"
+                values[name] = tokens[position]
+            masked_text = " ".join(masked)
+            if intent["destructive"] and masked_text != pattern["text"]:
+                continue
+            score = _similarity(masked_text, pattern["text"])
+            if score < threshold or (best is not None and score <= best.score):
+                continue
+            script = self._render(pattern["intent"], values, shell)
+            if script is not None:
+                best = IntentMatch(pattern["intent"], script, score)
+        return best
+
+    def _render(self, intent_id: str, values: Dict[str, Tuple[str, str]], shell: str) -> Optional[str]:
+        intent = self.data["intents"][intent_id]
+        if not self.supports(intent_id, shell):
+            return None
+        options = intent["commands"].get(shell) or intent["commands"]["posix"]
+
+        filled = {}
+        for name, (normalized, value) in values.items():
+            kind = intent["slots"].get(name, "path")
+            if kind == "ext":
+                # "logs", "Python" and ".log" all mean an extension; "old" doesn't
+                extension = EXTENSION_ALIASES.get(normalized, normalized)
+                if extension not in KNOWN_EXTENSIONS and not extension.startswith((".", "*.")):
+                    return None
+                value = extension.lstrip("*.")
+            elif kind == "path" and len(value) > 1:
+                value = value.rstrip("/")
+            pattern, quoted = SLOT_TYPES.get(kind, SLOT_TYPES["path"])
+            if not pattern.match(value):
+                return None
+            filled[name] = _quote(value, shell) if quoted else value
+
+        for command in [options] if isinstance(options, str) else options:
+            script = SLOT.sub(lambda m: filled.get(m.group(1), m.group(0)), command)
+            # Of several ways to do it, the first whose programs are all installed
+            if isinstance(options, str) or _installed(script):
+                return script
+        return None
+
+
+def _quote(value: str, shell: str) -> str:
+    if shell in ("powershell", "pwsh"):
+        return "'" + value.replace("'", "''") + "'"
+    return shlex.quote(value)
+
+
+def _installed(script: str) -> bool:
+    from .capabilities import get_capabilities
+    from .script_checks import command_names
+
+    capabilities = get_capabilities()
+    return all(capabilities.has(name) or "/" in name for name in command_names(script))
+
+
+_library: Optional[IntentLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_intent_library() -> IntentLibrary:
+    global _library
+    with _library_lock:
+        if _library is None:
+            if not LIBRARY_PATH.is_file():
+                logger.warning("The intent library is missing from the installation (%s); every prompt goes to the model", LIBRARY_PATH)
+            _library = IntentLibrary([LIBRARY_PATH, USER_LIBRARY_PATH])
+        return _library
+
+
+def get_intent_threshold() -> float:
+    """The configured threshold; 0 turns template answers off."""
+    return float(get_config().get("INTENT_THRESHOLD", DEFAULT_CONFIG["INTENT_THRESHOLD"]))
+
+
+_stats_lock = threading.Lock()
+
+
+def record_lookup(prompt: str, match: Optional[IntentMatch]):
+    """Counts a lookup towards the hit rate; misses are kept so the library can grow where it matters."""
+    with _stats_lock:
+        _record_lookup(prompt, match)
+
+
+def _record_lookup(prompt: str, match: Optional[IntentMatch]):
+    stats = load_stats()
+    stats["lookups"] += 1
+    if match is not None:
+        stats["hits"] += 1
+        stats["intents"][match.intent] = stats["intents"].get(match.intent, 0) + 1
+    else:
+        key = " ".join(norm for norm, _original in _tokens(prompt))
+        misses = stats["misses"]
+        misses[key] = misses.get(key, 0) + 1
+        if len(misses) > MAX_MISSES:
+            stats["misses"] = dict(Counter(misses).most_common(MAX_MISSES // 2))
+    try:
+        tmp_path = STATS_PATH.with_name(f"{STATS_PATH.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, STATS_PATH)
+    except OSError:
+        pass
+
+
+def load_stats() -> dict:
+    stats = {"lookups": 0, "hits": 0, "intents": {}, "misses": {}}
+    try:
+        with open(STATS_PATH, "r", encoding="utf-8") as f:
+            stats.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    return stats
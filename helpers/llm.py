@@ -0,0 +1,360 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from .context_cache import CONTEXTS_PATH, ContextCache
+from .error import KnownError
+from .i18n import _
+
+# Selected with the PROVIDER config key
+PROVIDERS = ("gemini", "openai", "stub")
+# Config keys that change how a client is built; the daemon gets the caller's values with each request
+CLIENT_SETTINGS = ("OPENAI_BASE_URL", "CONTEXT_CACHE", "STUB_LATENCY", "STUB_TOKENS_PER_SECOND", "STUB_FAILURE_RATE")
+
+
+class Message(NamedTuple):
+    """A chat message. Kept independent of llama-index so callers don't have to import it."""
+    role: str
+    content: str
+
+
+def to_llama_messages(messages: Sequence[Message]):
+    from llama_index.core.llms import ChatMessage
+    return [ChatMessage(role=m.role, content=m.content) for m in messages]
+
+
+def get_provider(config: Optional[Dict[str, Any]] = None) -> str:
+    from .config import get_config, DEFAULT_CONFIG
+    config = get_config() if config is None else config
+    provider = (config.get("PROVIDER") or DEFAULT_CONFIG["PROVIDER"]).lower()
+    if provider not in PROVIDERS:
+        raise KnownError(f"{_('Invalid provider')}: {provider} ({', '.join(PROVIDERS)})")
+    return provider
+
+
+def _require_key(provider: str, key: Optional[str]):
+    if provider == "gemini" and not key:
+        raise KnownError(
+            _("Please set your Google Gemini API key via `ai config set GOOGLE_API_KEY=<your_token>`")
+        )
+
+
+def get_api_key(config: Dict[str, Any]) -> Optional[str]:
+    """The API key for the configured provider; raises if that provider needs one and it isn't set."""
+    provider = get_provider(config)
+    if provider == "gemini":
+        key = config.get("GOOGLE_API_KEY")
+        _require_key(provider, key)
+        return key
+    if provider == "openai":
+        # Local OpenAI-compatible servers usually don't check the key
+        return config.get("OPENAI_API_KEY") or ""
+    return ""
+
+
+class LLM:
+    """
+    What every provider implements. Responses are shaped like llama-index's:
+    `.text` for complete(), `.delta` for streamed chunks and `.message.content` for chat().
+    Subclasses only need stream_chat(); the rest is built on top of it.
+    Providers with a context-caching API also implement create_context() and get a
+    `contexts` cache when CONTEXT_CACHE is on; see with_context().
+    """
+
+    contexts: Optional[ContextCache] = None
+
+    def complete(self, prompt: str):
+        return SimpleNamespace(text="".join(r.delta for r in self.stream_chat([Message("user", prompt)])))
+
+    def chat(self, messages: Sequence[Message]):
+        content = "".join(r.delta for r in self.stream_chat(messages))
+        return SimpleNamespace(message=SimpleNamespace(role="assistant", content=content))
+
+    def stream_chat(self, messages: Sequence[Message]):
+        raise NotImplementedError
+
+    async def achat(self, messages: Sequence[Message]):
+        return await asyncio.to_thread(self.chat, messages)
+
+    async def astream_chat(self, messages: Sequence[Message]):
+        stream = iter(self.stream_chat(messages))
+
+        async def deltas():
+            while (r := await asyncio.to_thread(next, stream, None)) is not None:
+                yield r
+
+        return deltas()
+
+    def create_context(self, prefix: str, ttl: int) -> str:
+        """Uploads a system prefix to the provider and returns the name to refer to it by."""
+        raise NotImplementedError
+
+    def with_context(self, messages: Sequence[Message]) -> Tuple[Sequence[Message], Optional[str]]:
+        """
+        Swaps a leading system message for the name of a cached context holding it,
+        when context caching is on and the provider accepts the prefix.
+        """
+        if self.contexts is None or not messages or messages[0].role != "system":
+            return messages, None
+        name = self.contexts.get(self.context_scope(), messages[0].content, self.create_context)
+        return (messages[1:], name) if name is not None else (messages, None)
+
+    def context_scope(self) -> str:
+        return type(self).__name__
+
+
+class GeminiLLM(LLM):
+    """
+    Google Gemini through llama-index. llama-index is only imported when the first
+    client is built, which never happens in processes served by the daemon.
+    """
+
+    # Gemini only caches contexts of at least this many tokens
+    MIN_CONTEXT_TOKENS = 1024
+
+    def __init__(self, key: str, model: str, contexts: Optional[ContextCache] = None):
+        from llama_index.llms.google_genai import GoogleGenAI
+        self._llm = GoogleGenAI(model=model, api_key=key)
+        self.model = model
+        self.contexts = contexts
+
+    def complete(self, prompt: str):
+        return self._llm.complete(prompt)
+
+    def create_context(self, prefix: str, ttl: int) -> str:
+        from google.genai import types
+        cached = self._llm._client.caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(system_instruction=prefix, ttl=f"{ttl}s", display_name="ai-shell"),
+        )
+        return cached.name
+
+    def context_scope(self) -> str:
+        return f"gemini/{self.model}"
+
+    def _request(self, messages: Sequence[Message]):
+        messages, context = self.with_context(messages)
+        kwargs = {"generation_config": {"cached_content": context}} if context else {}
+        return to_llama_messages(messages), kwargs
+
+    def chat(self, messages: Sequence[Message]):
+        messages, kwargs = self._request(messages)
+        return self._llm.chat(messages, **kwargs)
+
+    def stream_chat(self, messages: Sequence[Message]):
+        messages, kwargs = self._request(messages)
+        return self._llm.stream_chat(messages, **kwargs)
+
+    async def achat(self, messages: Sequence[Message]):
+        messages, kwargs = self._request(messages)
+        return await self._llm.achat(messages, **kwargs)
+
+    async def astream_chat(self, messages: Sequence[Message]):
+        messages, kwargs = self._request(messages)
+        return await self._llm.astream_chat(messages, **kwargs)
+
+
+class OpenAICompatibleLLM(LLM):
+    """Any server speaking the OpenAI chat completions API (llama.cpp, vLLM, Ollama...), over plain urllib."""
+
+    def __init__(self, key: str, model: str, base_url: str):
+        self.key = key
+        self.model = model
+        self.url = base_url.rstrip("/") + "/chat/completions"
+
+    def stream_chat(self, messages: Sequence[Message]):
+        import urllib.request
+
+        body = {
+            "model": self.model,
+            "messages": [{"role": m.role, "content": m.content} for m in messages],
+            "stream": True,
+        }
+        headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+        if self.key:
+            headers["Authorization"] = f"Bearer {self.key}"
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode("utf-8"), headers=headers)
+        with urllib.request.urlopen(request) as response:
+            # Server-sent events: one "data: {...}" line per chunk, then "data: [DONE]"
+            for line in response:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield SimpleNamespace(delta=delta)
+
+
+class StubLLM(LLM):
+    """
+    Offline provider for load tests and benchmarks. Replies are canned and streamed
+    with a fixed time to first token and token rate; failures are injected at
+    `failure_rate` from a seeded generator, so runs are reproducible.
+    It also plays a provider with context caching: requests that name a cached
+    context are counted in `prefix_hits` and `cached_tokens`, and the prompt
+    processing half of their time to first token shrinks with the cached share.
+    """
+
+    # Share of the time to first token spent reading the prompt
+    PREFILL_SHARE = 0.5
+
+    SCRIPT = "find . -name '*.js' -type f"
+    EXPLANATION = "1. Searches the current directory recursively.\n2. Matches files ending in .js.\n"
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        tokens_per_second: float = 200,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        contexts: Optional[ContextCache] = None,
+    ):
+        self.latency = latency
+        self.token_delay = 1 / tokens_per_second if tokens_per_second > 0 else 0
+        self.failure_rate = failure_rate
+        self.contexts = contexts
+        self.calls = 0
+        # Input tokens sent, of which were read from a cached context
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.prefix_hits = 0
+        self._cached_contexts: Dict[str, str] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def reply(self, messages: Sequence[Message]) -> str:
+        """The canned reply for a request, chosen by which of our prompts it is."""
+        from .prompts import EXPLANATION_MARKER
+        # Our instructions are in the system prefix, the request itself in the last message
+        prompt = "\n".join(m.content for m in messages if m.role == "system") + "\n" + messages[-1].content
+        if EXPLANATION_MARKER in prompt:
+            return f"{self.SCRIPT}\n{EXPLANATION_MARKER}\n{self.EXPLANATION}"
+        if "single line command" in prompt:
+            return self.SCRIPT
+        if "description of the following script" in prompt:
+            return self.EXPLANATION
+        if "running summary" in prompt:
+            return "The user asked about shell commands."
+        return f"Stub reply to: {messages[-1].content[:60]}"
+
+    def create_context(self, prefix: str, ttl: int) -> str:
+        import hashlib
+        name = "cachedContents/stub-" + hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            self._cached_contexts[name] = prefix
+        return name
+
+    def _start(self, messages: Sequence[Message]) -> Tuple[str, float]:
+        """The reply and the time to first token for a request."""
+        from .chat_history import estimate_tokens
+        messages, context = self.with_context(messages)
+        cached = 0
+        if context is not None:
+            prefix = self._cached_contexts[context]
+            messages = [Message("system", prefix), *messages]
+            cached = estimate_tokens(prefix)
+        total = sum(estimate_tokens(m.content) for m in messages)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += total
+            self.cached_tokens += cached
+            self.prefix_hits += context is not None
+            fail = self._random.random() < self.failure_rate
+        if fail:
+            # Worded like a rate limit, so retry logic can be exercised
+            raise Exception("429 RESOURCE_EXHAUSTED: injected by the stub provider, retry after 0.1s")
+        ttft = self.latency * (1 - self.PREFILL_SHARE * cached / total) if total else self.latency
+        return self.reply(messages), ttft
+
+    @staticmethod
+    def _tokens(text: str):
+        # Roughly 4 characters per token
+        for i in range(0, len(text), 4):
+            yield text[i:i + 4]
+
+    def stream_chat(self, messages: Sequence[Message]):
+        text, ttft = self._start(messages)
+        time.sleep(ttft)
+        for token in self._tokens(text):
+            time.sleep(self.token_delay)
+            yield SimpleNamespace(delta=token)
+
+    async def astream_chat(self, messages: Sequence[Message]):
+        text, ttft = self._start(messages)
+
+        async def deltas():
+            await asyncio.sleep(ttft)
+            for token in self._tokens(text):
+                await asyncio.sleep(self.token_delay)
+                yield SimpleNamespace(delta=token)
+
+        return deltas()
+
+
+def client_settings(config: Optional[Dict[str, Any]] = None) -> Tuple[Tuple[str, str], ...]:
+    """The effective CLIENT_SETTINGS, as a hashable and JSON-friendly tuple of (key, value) pairs."""
+    from .config import get_config, DEFAULT_CONFIG
+    config = get_config() if config is None else config
+    return tuple((name, str(config.get(name, DEFAULT_CONFIG[name]))) for name in CLIENT_SETTINGS)
+
+
+def create_llm(provider: str, key: str, model: str, config: Optional[Dict[str, Any]] = None) -> LLM:
+    """Builds a new in-process client for a provider."""
+    from .config import get_config, DEFAULT_CONFIG
+    config = get_config() if config is None else config
+
+    def setting(name: str):
+        return config.get(name, DEFAULT_CONFIG[name])
+
+    context_cache = str(setting("CONTEXT_CACHE")).lower() == "true"
+    if provider == "gemini":
+        contexts = ContextCache(CONTEXTS_PATH, GeminiLLM.MIN_CONTEXT_TOKENS) if context_cache else None
+        return GeminiLLM(key, model, contexts)
+    if provider == "openai":
+        # OpenAI-compatible servers have no context API; they cache repeated prefixes on their own
+        return OpenAICompatibleLLM(key, model, setting("OPENAI_BASE_URL"))
+    return StubLLM(
+        latency=float(setting("STUB_LATENCY")),
+        tokens_per_second=float(setting("STUB_TOKENS_PER_SECOND")),
+        failure_rate=float(setting("STUB_FAILURE_RATE")),
+        # The stub's contexts only live as long as the process, so neither do their names
+        contexts=ContextCache(None) if context_cache else None,
+    )
+
+
+# One client per (provider, key, model, settings) for the whole process. Each GoogleGenAI
+# owns an HTTP client, so reusing it keeps connections (and TLS sessions) alive
+# across the script -> explanation -> revision calls of a session.
+_llm_pool: Dict[Tuple[str, str, str, tuple], object] = {}
+_llm_pool_lock = threading.Lock()
+
+def get_llm(key: str, model: str, provider: Optional[str] = None, settings: Optional[Tuple[Tuple[str, str], ...]] = None):
+    """
+    Returns the shared LLM for the configured provider, key, model and client
+    settings: a client of the `ai daemon` when one is running, otherwise an
+    in-process client.
+    """
+    provider = provider or get_provider()
+    settings = client_settings() if settings is None else settings
+    _require_key(provider, key)
+    from .daemon import daemon_available, RemoteLLM
+
+    pool_key = (provider, key, model, settings)
+    with _llm_pool_lock:
+        llm = _llm_pool.get(pool_key)
+        if llm is None:
+            # The stub is there to measure our own code, so it never goes through the daemon
+            if provider != "stub" and daemon_available():
+                llm = RemoteLLM(provider, key, model, settings)
+            else:
+                llm = create_llm(provider, key, model, dict(settings))
+            _llm_pool[pool_key] = llm
+        return llm
@@ -0,0 +1,103 @@
+from functools import lru_cache
+from typing import List, NamedTuple
+
+from .llm import Message
+
+# Separates the command from its explanation in a combined response
+EXPLANATION_MARKER = "@@EXPLANATION@@"
+
+
+class PromptTemplate(NamedTuple):
+    """
+    A prompt split into a system prefix that only depends on the setup (shell, OS,
+    installed tools, language) and a user suffix with the request itself. The prefix
+    is byte-for-byte the same on every call, so providers can cache it.
+    Bump `version` whenever the wording changes; it is part of the response cache key.
+    """
+    name: str
+    version: int
+    system: str
+    user: str
+
+    @property
+    def tag(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
+SCRIPT = PromptTemplate("script", 2, """
+Create a single line command that one can enter in a terminal and run, based on what is specified in the prompt.
+{shell}
+Only reply with the single line command. It must be able to be directly run in the target shell. Do not include any other text, explanations, or code fences.
+Make sure the command runs on the {os} operating system.
+{environment}
+""", """
+{tools}
+The prompt is: {prompt}
+{variant}
+""")
+
+SCRIPT_WITH_EXPLANATION = PromptTemplate("script+explanation", 2, """
+Create a single line command that one can enter in a terminal and run, based on what is specified in the prompt.
+{shell}
+Reply with the single line command first. It must be able to be directly run in the target shell. Do not include code fences.
+Make sure the command runs on the {os} operating system.
+{environment}
+Then write {marker} on its own line, followed by a clear, concise description of the command, using minimal words. Outline the steps in a list format.
+Please reply in the user's language: {language}
+""", """
+{tools}
+The prompt is: {prompt}
+""")
+
+EXPLANATION = PromptTemplate("explanation", 2, """
+Please provide a clear, concise description of the following script, using minimal words. Outline the steps in a list format.
+Please reply in the user's language: {language}
+""", """
+The script is: {script}
+""")
+
+REVISION = PromptTemplate("revision", 2, """
+Update the following script based on what is asked in the following prompt.
+{shell}
+{environment}
+Only reply with the single line command. It must be able to be directly run in the target shell. Do not include any other text, explanations, or code fences.
+""", """
+{tools}
+The script: {code}
+The prompt: {prompt}
+""")
+
+
+def _fill(text: str, **values: str) -> str:
+    lines = []
+    for line in text.strip().splitlines():
+        filled = line.format(**values)
+        # Placeholders that came out empty don't leave blank lines behind
+        if filled.strip() or "{" not in line:
+            lines.append(filled)
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=32)
+def system_prefix(template: PromptTemplate, shell: str, os: str, environment: str, language: str) -> str:
+    """The rendered system prefix, built once per template and setup."""
+    return _fill(
+        template.system, shell=shell, os=os, environment=environment, language=language, marker=EXPLANATION_MARKER
+    )
+
+
+def render(
+    template: PromptTemplate,
+    shell: str = "",
+    os: str = "",
+    environment: str = "",
+    language: str = "",
+    tools: List[str] = (),
+    **values: str,
+) -> List[Message]:
+    """The system and user messages for a template; `tools` are installed programs the request mentions."""
+    mentioned = f"Also installed: {', '.join(tools)}." if tools else ""
+    return [
+        Message("system", system_prefix(template, shell, os, environment, language)),
+        Message("user", _fill(template.user, tools=mentioned, **values)),
+    ]
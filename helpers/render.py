@@ -0,0 +1,86 @@
+import sys
+import threading
+import time
+from typing import List, Optional
+
+# How often streamed text reaches the terminal, at most
+FRAME_INTERVAL = 1 / 30
+
+
+class StreamRenderer:
+    """
+    Prints streamed text as it arrives, batching writes to one per frame instead of
+    one per token. Text left over at the end of a frame is written by a timer, so
+    nothing waits for the next chunk to show up.
+
+    With markdown=True the text is re-rendered as Markdown in a rich Live region
+    instead. That takes over the cursor, so only use it when nothing else (like an
+    open prompt) is drawing on the terminal.
+    """
+
+    def __init__(self, markdown: bool = False, frame_interval: float = FRAME_INTERVAL):
+        self.frame_interval = frame_interval
+        self._parts: List[str] = []
+        self._pending: List[str] = []
+        self._last_flush = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._live = None
+        if markdown:
+            from rich.live import Live
+            from rich.markdown import Markdown
+            self._markdown = Markdown
+            self._live = Live(Markdown(""), auto_refresh=False)
+
+    def __enter__(self) -> "StreamRenderer":
+        if self._live is not None:
+            self._live.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        if self._live is not None:
+            self._live.__exit__(*exc_info)
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def write(self, chunk: str):
+        if not chunk:
+            return
+        with self._lock:
+            self._parts.append(chunk)
+            self._pending.append(chunk)
+            wait = self._last_flush + self.frame_interval - time.monotonic()
+            if wait <= 0:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        pending = "".join(self._pending)
+        self._pending = []
+        if self._live is not None:
+            self._live.update(self._markdown(self.text), refresh=True)
+        else:
+            # Looked up every time: patch_stdout() may have swapped it since we started
+            sys.stdout.write(pending)
+            sys.stdout.flush()
+
+    def close(self) -> str:
+        """Writes whatever is still pending and returns the full text."""
+        self.flush()
+        return self.text
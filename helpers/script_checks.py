@@ -0,0 +1,138 @@
+import re
+import shlex
+import shutil
+import subprocess
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# Shells that can check syntax without running anything (`<shell> -n -c script`)
+SYNTAX_CHECK_SHELLS = {"bash", "sh", "zsh", "dash", "ksh"}
+
+# Words that can start a command but are not looked up on PATH
+SHELL_WORDS = {
+    "if", "then", "else", "elif", "fi", "for", "while", "until", "do", "done", "case", "esac",
+    "in", "function", "select", "time", "!", "{", "}", "[[", "]]", "(", ")",
+    "cd", "echo", "export", "set", "unset", "source", ".", "alias", "eval", "exec", "exit",
+    "read", "printf", "test", "[", "true", "false", "type", "command", "builtin", "local",
+    "return", "shift", "trap", "ulimit", "umask", "wait", "pushd", "popd", "let", "declare",
+}
+# Shell words after which the next word is a command again
+COMMAND_STARTERS = {"if", "then", "else", "elif", "do", "while", "until", "!", "{", "time"}
+# Commands that run the next word as a command
+PREFIX_COMMANDS = {"sudo", "env", "nohup", "nice", "time", "xargs", "exec", "command", "builtin", "doas"}
+
+# (pattern, description) for commands worth a second look before running
+DESTRUCTIVE_PATTERNS = [
+    (re.compile(r"\brm\s+(-[a-zA-Z]*[rR][a-zA-Z]*\s+-?[a-zA-Z]*f|-[a-zA-Z]*f[a-zA-Z]*\s+-?[a-zA-Z]*[rR]|-[a-zA-Z]*(rf|fr))"), "rm -rf"),
+    (re.compile(r"\brm\s.*(\s/\s*$|\s/\*|\s~/?\s*$)"), "rm on / or ~"),
+    (re.compile(r"\bmkfs(\.\w+)?\b"), "mkfs"),
+    (re.compile(r"\bdd\b.*\bof=/dev/"), "dd to a device"),
+    (re.compile(r">\s*/dev/(sd|nvme|hd|disk)"), "write to a device"),
+    (re.compile(r"\bchmod\s+(-R\s+)?0?777\b"), "chmod 777"),
+    (re.compile(r"\bchown\s+-R\b"), "recursive chown"),
+    (re.compile(r"\bgit\s+push\b.*(--force\b|-f\b)"), "git push --force"),
+    (re.compile(r"\bgit\s+reset\s+--hard\b"), "git reset --hard"),
+    (re.compile(r"\bgit\s+clean\s+-[a-zA-Z]*f"), "git clean -f"),
+    (re.compile(r":\(\)\s*\{\s*:\|:&\s*\};:"), "fork bomb"),
+    (re.compile(r"\b(shutdown|reboot|halt|poweroff)\b"), "shutdown"),
+    (re.compile(r"\btruncate\s+-s\s*0\b"), "truncate"),
+    (re.compile(r"\bfind\b.*\s-delete\b"), "find -delete"),
+    (re.compile(r"\b(DROP|TRUNCATE)\s+(TABLE|DATABASE)\b", re.IGNORECASE), "drops a table"),
+    (re.compile(r"\bcurl\b[^|]*\|\s*(sudo\s+)?(ba|z)?sh\b"), "pipes a download into a shell"),
+]
+
+# Score penalties; candidates are ranked by the sum
+SYNTAX_ERROR_PENALTY = 5
+MISSING_COMMAND_PENALTY = 2
+DESTRUCTIVE_PENALTY = 1
+
+
+@dataclass
+class CheckedScript:
+    script: str
+    syntax_error: Optional[str] = None
+    missing_commands: List[str] = field(default_factory=list)
+    destructive: List[str] = field(default_factory=list)
+
+    @property
+    def penalty(self) -> int:
+        return (
+            (SYNTAX_ERROR_PENALTY if self.syntax_error else 0)
+            + MISSING_COMMAND_PENALTY * len(self.missing_commands)
+            + DESTRUCTIVE_PENALTY * len(self.destructive)
+        )
+
+
+def check_syntax(script: str, shell: str) -> Optional[str]:
+    """The shell's complaint if the script doesn't parse; None if it does or the shell can't check."""
+    if shell not in SYNTAX_CHECK_SHELLS or shutil.which(shell) is None:
+        return None
+    try:
+        proc = subprocess.run([shell, "-n", "-c", script], capture_output=True, text=True, timeout=2)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if proc.returncode == 0:
+        return None
+    return (proc.stderr.strip().splitlines() or ["syntax error"])[-1]
+
+
+def command_names(script: str) -> List[str]:
+    """The programs a one-liner runs: the first word of each pipeline stage, past env and sudo."""
+    try:
+        lexer = shlex.shlex(script, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return []
+
+    names = []
+    expect_command = True
+    skip_next = False
+    for token in tokens:
+        if skip_next:
+            # The target of a redirection
+            skip_next = False
+            continue
+        if token and all(c in "<>&" for c in token) and token not in ("&", "&&"):
+            skip_next = True
+            continue
+        if token and all(c in "|&;()" for c in token):
+            expect_command = True
+            continue
+        if not expect_command:
+            continue
+        if re.match(r"^[A-Za-z_][A-Za-z0-9_]*=", token) or token in PREFIX_COMMANDS or token.startswith("-"):
+            continue
+        if token not in SHELL_WORDS and not token.startswith(("$", "`")):
+            names.append(token)
+        expect_command = token in COMMAND_STARTERS
+    return names
+
+
+def missing_commands(script: str) -> List[str]:
+    """Programs the script runs that are neither on PATH nor a path to an executable."""
+    missing = []
+    for name in command_names(script):
+        if shutil.which(name) is None and name not in missing:
+            missing.append(name)
+    return missing
+
+
+def destructive_patterns(script: str) -> List[str]:
+    return [description for pattern, description in DESTRUCTIVE_PATTERNS if pattern.search(script)]
+
+
+def check_script(script: str, shell: str) -> CheckedScript:
+    return CheckedScript(
+        script=script,
+        syntax_error=check_syntax(script, shell),
+        missing_commands=missing_commands(script),
+        destructive=destructive_patterns(script),
+    )
+
+
+def rank_scripts(scripts: List[str], shell: str) -> List[CheckedScript]:
+    """Dedupes scripts and orders them by penalty; ties keep their original order."""
+    unique = list(dict.fromkeys(s.strip() for s in scripts if s.strip()))
+    checked = [check_script(script, shell) for script in unique]
+    return sorted(checked, key=lambda c: c.penalty)
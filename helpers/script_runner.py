@@ -0,0 +1,147 @@
+import os
+import re
+import select
+import subprocess
+import sys
+import time
+from typing import NamedTuple, Optional
+try:
+    import fcntl
+    import pty
+    import termios
+except ImportError:  # Windows
+    pty = None
+
+# Bytes of output kept for a failed command, whatever it prints
+TAIL_BYTES = 8192
+READ_SIZE = 65536
+# Seconds between checks that the shell is still running while it prints nothing
+POLL_INTERVAL = 0.05
+
+ANSI_ESCAPE = re.compile(r"\x1b(\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(\x07|\x1b\\)|[@-Z\\-_])")
+
+
+class RunResult(NamedTuple):
+    returncode: int
+    tail: str
+    truncated: bool
+
+    @property
+    def failed(self) -> bool:
+        return self.returncode != 0
+
+
+class OutputTail:
+    """Keeps the last `size` bytes written to it, so memory stays constant however much a command prints."""
+
+    def __init__(self, size: int = TAIL_BYTES):
+        self.size = size
+        self.buffer = bytearray()
+        self.truncated = False
+
+    def write(self, data: bytes):
+        if len(data) >= self.size:
+            self.buffer[:] = data[-self.size:]
+            self.truncated = True
+            return
+        self.buffer += data
+        excess = len(self.buffer) - self.size
+        if excess > 0:
+            del self.buffer[:excess]
+            self.truncated = True
+
+    def text(self) -> str:
+        """The tail as text, without colors or cursor movement, starting at a whole line."""
+        text = self.buffer.decode("utf-8", errors="replace")
+        if self.truncated and "\n" in text:
+            text = text.split("\n", 1)[1]
+        text = ANSI_ESCAPE.sub("", text).replace("\r\n", "\n")
+        # Progress bars redraw a line with \r; keep what was drawn last
+        return "\n".join(line.rsplit("\r", 1)[-1] for line in text.split("\n")).strip()
+
+
+def _copy_window_size(fd: int):
+    try:
+        size = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, b"\0" * 8)
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, size)
+    except (OSError, ValueError):
+        pass
+
+
+def _pump(read_fd: int, tail: OutputTail, proc: subprocess.Popen):
+    """
+    Copies the command's output to our stdout as it comes, keeping the tail.
+    Returns once the shell has exited and what it printed is drained: a background
+    job (`server &`) holds the output open, but we don't wait for it.
+    """
+    out = sys.stdout.buffer
+    drain_until = None
+    while True:
+        if os.name != "nt":
+            # select() only works on pipes outside Windows; there, read until EOF
+            if drain_until is None and proc.poll() is not None:
+                # A background job may keep writing, so only drain for a moment
+                drain_until = time.monotonic() + POLL_INTERVAL
+            readable, _, _ = select.select([read_fd], [], [], 0 if drain_until else POLL_INTERVAL)
+            if drain_until is not None and (not readable or time.monotonic() > drain_until):
+                break
+            if not readable:
+                continue
+        try:
+            data = os.read(read_fd, READ_SIZE)
+        except OSError:
+            # EIO: the pty closes when the last process holding it exits
+            break
+        if not data:
+            break
+        out.write(data)
+        out.flush()
+        tail.write(data)
+
+
+def run_streaming(script: str, shell: Optional[str] = None, tail_bytes: int = TAIL_BYTES) -> RunResult:
+    """
+    Runs a script with its output shown live and its last `tail_bytes` kept.
+    On a terminal the command gets a pty, so it still colors and line-buffers its
+    output as if it ran directly; stdout and stderr are captured together.
+    """
+    tail = OutputTail(tail_bytes)
+    sys.stdout.flush()
+    use_pty = pty is not None and sys.stdout.isatty()
+    if use_pty:
+        master, slave = pty.openpty()
+        _copy_window_size(slave)
+        proc = subprocess.Popen(script, shell=True, executable=shell, stdout=slave, stderr=slave)
+        os.close(slave)
+        read_fd = master
+    else:
+        proc = subprocess.Popen(script, shell=True, executable=shell, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        read_fd = proc.stdout.fileno()
+
+    try:
+        while True:
+            try:
+                _pump(read_fd, tail, proc)
+                break
+            except KeyboardInterrupt:
+                # Ctrl+C reached the command as well; show whatever it prints while exiting
+                continue
+    finally:
+        if use_pty:
+            os.close(master)
+        else:
+            proc.stdout.close()
+        returncode = proc.wait()
+    return RunResult(returncode, tail.text(), tail.truncated)
+
+
+def failure_prompt(result: RunResult) -> str:
+    """What to ask for when a command failed: its exit code and the end of what it printed."""
+    output = result.tail or "(no output)"
+    if result.truncated:
+        output = f"[...]\n{output}"
+    return (
+        f"Running the script failed with exit code {result.returncode}. "
+        f"The end of its output was:\n{output}\n"
+        "Fix the script so it does what it was meant to."
+    )
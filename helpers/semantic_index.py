@@ -0,0 +1,147 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from .config import get_config, DEFAULT_CONFIG
+
+INDEX_PATH = Path.home() / ".ai_shell_semantic_index.jsonl"
+# Older entries are compacted away past this many
+MAX_ENTRIES = 5000
+# Number of hash buckets in the embedding
+DIMENSIONS = 4096
+
+# Words that mean the same thing in a shell request
+SYNONYMS = {
+    "show": "list", "display": "list", "print": "list", "get": "list", "find": "list", "ls": "list",
+    "remove": "delete", "rm": "delete", "erase": "delete", "del": "delete", "clean": "delete",
+    "make": "create", "new": "create", "mkdir": "create", "touch": "create",
+    "dir": "directory", "dirs": "directory", "folder": "directory", "folders": "directory",
+    "file": "files", "javascript": "js", "typescript": "ts", "python": "py",
+    "commit": "commits", "log": "logs",
+}
+STOPWORDS = {"a", "an", "the", "all", "me", "my", "of", "in", "on", "for", "please", "to", "every", "any", "some", "that", "this", "with"}
+
+
+class Suggestion(NamedTuple):
+    prompt: str
+    command: str
+    score: float
+
+
+def _terms(text: str) -> List[str]:
+    words = []
+    for word in re.findall(r"[a-z0-9_.\-*]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        word = SYNONYMS.get(word, word)
+        # Poor man's stemming: "files" and "file" should meet
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    # Bigrams keep a little word order, so "delete js files" != "list js files"
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _bucket(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "big") % DIMENSIONS
+
+
+def hash_terms(text: str) -> Dict[int, int]:
+    """Term frequencies of a prompt in hashed-bucket space (the un-weighted embedding)."""
+    return dict(Counter(_bucket(term) for term in _terms(text)))
+
+
+class SemanticIndex:
+    """
+    A local, append-only index of past (prompt -> command) pairs. Prompts are
+    embedded with a hashing TF-IDF embedder, so everything works offline.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: Optional[List[dict]] = None
+        self._df: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = []
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._add(entry)
+
+    def _add(self, entry: dict):
+        entry["tf"] = hash_terms(entry["prompt"])
+        self._entries.append(entry)
+        self._df.update(entry["tf"].keys())
+
+    def _embed(self, tf: Dict[int, int]) -> Dict[int, float]:
+        total = len(self._entries) + 1
+        vector = {b: (1 + math.log(count)) * math.log((total + 1) / (self._df[b] + 1) + 1) for b, count in tf.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {b: v / norm for b, v in vector.items()}
+
+    def add(self, prompt: str, command: str, context: str):
+        """Records a generated command; `context` (shell and OS) must match for it to be suggested."""
+        entry = {"prompt": prompt, "command": command, "context": context, "ts": int(time.time())}
+        with self._lock:
+            self._load()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._add(entry)
+            if len(self._entries) > MAX_ENTRIES * 1.2:
+                self._compact()
+
+    def _compact(self):
+        self._entries = self._entries[-MAX_ENTRIES:]
+        self._df = Counter()
+        for entry in self._entries:
+            self._df.update(entry["tf"].keys())
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries:
+                f.write(json.dumps({k: v for k, v in entry.items() if k != "tf"}, ensure_ascii=False) + "\n")
+        tmp_path.replace(self.path)
+
+    def search(self, prompt: str, context: str, threshold: float) -> Optional[Suggestion]:
+        """The most similar past prompt for this context, if it scores at least `threshold`."""
+        with self._lock:
+            self._load()
+            query = self._embed(hash_terms(prompt))
+            best: Optional[Suggestion] = None
+            for entry in self._entries:
+                if entry["context"] != context:
+                    continue
+                vector = self._embed(entry["tf"])
+                score = sum(weight * vector.get(b, 0.0) for b, weight in query.items())
+                if score >= threshold and (best is None or score > best.score):
+                    best = Suggestion(entry["prompt"], entry["command"], score)
+            return best
+
+
+_semantic_index: Optional[SemanticIndex] = None
+
+
+def get_semantic_index() -> SemanticIndex:
+    """Returns the process-wide index; it is read from disk on first use."""
+    global _semantic_index
+    if _semantic_index is None:
+        _semantic_index = SemanticIndex(INDEX_PATH)
+    return _semantic_index
+
+
+def get_similarity_threshold() -> float:
+    """The configured threshold; 0 turns suggestions off."""
+    return float(get_config().get("SEMANTIC_THRESHOLD", DEFAULT_CONFIG["SEMANTIC_THRESHOLD"]))
@@ -1,6 +1,15 @@
 import os
+import re
+import time
 from pathlib import Path
 
+# How much of the end of the history file to read at a time
+TAIL_BLOCK_SIZE = 8192
+
+# zsh EXTENDED_HISTORY entries look like ": <start>:<elapsed>;<command>"
+ZSH_EXTENDED_ENTRY = re.compile(r"^: \d+:\d+;")
+FISH_ENTRY = "- cmd: "
+
 def get_history_file() -> str | None:
     """
     Gets the history file path based on the current shell.
@@ -17,25 +26,119 @@ def get_history_file() -> str | None:
     }
     return str(history_map.get(shell_name)) if shell_name in history_map else None
 
+def get_history_format(history_file: str) -> str:
+    """Returns 'fish', 'zsh' or 'plain' (one command per line) for a history file."""
+    name = os.path.basename(history_file)
+    if name == "fish_history":
+        return "fish"
+    if name == ".zsh_history":
+        return "zsh"
+    return "plain"
+
+def read_tail_lines(path: str, min_lines: int = 1, block_size: int = TAIL_BLOCK_SIZE) -> tuple[list[str], bool, bool]:
+    """
+    Reads complete lines from the end of a file, seeking backwards one block at a
+    time until at least `min_lines` are found.
+    Returns (lines, whether the file ends with a newline, whether the start of the file was reached).
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return [], True, True
+        data = b""
+        start = end
+        while start > 0:
+            start = max(0, start - block_size)
+            f.seek(start)
+            data = f.read(end - start)
+            # Need one more newline than lines wanted: the first line may be partial
+            if data.count(b"\n") > min_lines:
+                break
+    ends_with_newline = data.endswith(b"\n")
+    lines = data.decode("utf-8", errors="ignore").split("\n")
+    if ends_with_newline:
+        lines.pop()
+    if start > 0:
+        lines = lines[1:]
+    return lines, ends_with_newline, start == 0
+
+def _unescape_fish(value: str) -> str:
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+def _escape_fish(command: str) -> str:
+    return command.replace("\\", "\\\\").replace("\n", "\\n")
+
+def _join_zsh_lines(lines: list[str]) -> str:
+    # zsh writes embedded newlines as a backslash at the end of the line
+    return "\n".join(line[:-1] if line.endswith("\\") else line for line in lines)
+
+def _last_entry(lines: list[str], history_format: str, reached_start: bool) -> str | None:
+    """
+    Parses the last command out of the tail of a history file. Returns None if
+    the tail doesn't reach back to the start of that entry.
+    """
+    if history_format == "fish":
+        for line in reversed(lines):
+            if line.startswith(FISH_ENTRY):
+                return _unescape_fish(line[len(FISH_ENTRY):])
+        return "" if reached_start else None
+
+    if history_format == "zsh":
+        for i in range(len(lines) - 1, -1, -1):
+            if ZSH_EXTENDED_ENTRY.match(lines[i]):
+                return _join_zsh_lines([ZSH_EXTENDED_ENTRY.sub("", lines[i]), *lines[i + 1:]])
+            if i == 0:
+                return _join_zsh_lines(lines) if reached_start else None
+            if not lines[i - 1].endswith("\\"):
+                # Plain format: nothing continues into this line, so it starts the entry
+                return _join_zsh_lines(lines[i:])
+        return ""
+
+    return lines[-1] if lines else ""
+
+def last_history_entry(history_file: str, history_format: str) -> tuple[str, bool, bool]:
+    """
+    Returns (last command, whether the file uses zsh extended format, whether it ends
+    with a newline). Only the tail is read, more of it only if the last entry spans many lines.
+    """
+    min_lines = 4
+    while True:
+        lines, ends_with_newline, reached_start = read_tail_lines(history_file, min_lines)
+        entry = _last_entry(lines, history_format, reached_start)
+        if entry is not None:
+            zsh_extended = any(ZSH_EXTENDED_ENTRY.match(line) for line in lines)
+            return entry, zsh_extended, ends_with_newline
+        min_lines *= 4
+
+def format_history_entry(command: str, history_format: str, zsh_extended: bool) -> str:
+    timestamp = int(time.time())
+    if history_format == "fish":
+        return f"{FISH_ENTRY}{_escape_fish(command)}\n  when: {timestamp}\n"
+    if history_format == "zsh":
+        command = command.replace("\n", "\\\n")
+        return f": {timestamp}:0;{command}\n" if zsh_extended else f"{command}\n"
+    return f"{command}\n"
+
 def append_to_shell_history(command: str):
     """
-    Appends a command to the shell's history file.
+    Appends a command to the shell's history file, unless it repeats the last entry.
+    Only the end of the file is read, so this stays fast on huge histories.
     """
     history_file = get_history_file()
     if not history_file:
         return
 
     try:
-        last_command = ""
+        history_format = get_history_format(history_file)
+        last_command, zsh_extended, ends_with_newline = "", False, True
         if os.path.exists(history_file):
-            with open(history_file, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()
-                if lines:
-                    last_command = lines[-1].strip()
-        
-        if command.strip() != last_command:
+            last_command, zsh_extended, ends_with_newline = last_history_entry(history_file, history_format)
+
+        if command.strip() != last_command.strip():
             with open(history_file, "a", encoding="utf-8") as f:
-                f.write(f"{command}\n")
+                if not ends_with_newline:
+                    f.write("\n")
+                f.write(format_history_entry(command, history_format, zsh_extended))
     except Exception:
         # Silently fail if there are any issues with reading/writing history
-        pass
\ No newline at end of file
+        pass
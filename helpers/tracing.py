@@ -0,0 +1,153 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+# Lightweight spans for `--profile`. Disabled (the default), span() hands back a
+# shared no-op context manager and traced_stream() returns the stream untouched,
+# so instrumented code pays one global lookup per call.
+
+# As close to process start as we can get without platform-specific calls
+PROCESS_START = time.perf_counter()
+
+_enabled = False
+_trace_path: Optional[str] = None
+_spans: List["Span"] = []
+_local = threading.local()
+_NOOP = nullcontext()
+
+
+class Span(NamedTuple):
+    name: str
+    start: float  # perf_counter seconds
+    end: float
+    thread: int
+    depth: int
+    args: Dict[str, Any]
+
+
+class _ActiveSpan:
+    __slots__ = ("name", "args", "start", "depth")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.depth = getattr(_local, "depth", 0)
+        _local.depth = self.depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        _local.depth = self.depth
+        _spans.append(Span(self.name, self.start, end, threading.get_ident(), self.depth, self.args))
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(trace_path: Optional[str] = None):
+    """Starts recording spans; the breakdown is printed (and the trace written) at exit."""
+    global _enabled, _trace_path
+    if _enabled:
+        return
+    _enabled = True
+    _trace_path = trace_path
+    record("startup", PROCESS_START, time.perf_counter())
+    atexit.register(_report)
+
+
+def span(name: str, **args):
+    """Context manager timing a stage, e.g. `with span("get_config"): ...`."""
+    if not _enabled:
+        return _NOOP
+    return _ActiveSpan(name, args)
+
+
+def record(name: str, start: float, end: float, **args):
+    """Records a span whose start and end were measured elsewhere."""
+    if _enabled:
+        _spans.append(Span(name, start, end, threading.get_ident(), getattr(_local, "depth", 0), args))
+
+
+def traced_stream(name: str, stream: Iterable) -> Iterable:
+    """
+    Wraps a stream to record `<name>.ttft` (until the first chunk) and `<name>` (until
+    the last one). Timing starts when the stream is first read, not when it's created.
+    """
+    if not _enabled:
+        return stream
+    return _traced_stream(name, stream)
+
+
+def _traced_stream(name: str, stream: Iterable) -> Iterator:
+    start = time.perf_counter()
+    first = True
+    chunks = 0
+    try:
+        for chunk in stream:
+            if first:
+                record(f"{name}.ttft", start, time.perf_counter())
+                first = False
+            chunks += 1
+            yield chunk
+    finally:
+        record(name, start, time.perf_counter(), chunks=chunks)
+
+
+def spans() -> List[Span]:
+    return list(_spans)
+
+
+def to_chrome_trace(recorded: List[Span]) -> Dict[str, Any]:
+    """Chrome trace event format; open it in chrome://tracing or https://ui.perfetto.dev."""
+    pid = os.getpid()
+    return {
+        "traceEvents": [
+            {
+                "name": s.name,
+                "ph": "X",
+                "ts": round((s.start - PROCESS_START) * 1e6, 1),
+                "dur": round((s.end - s.start) * 1e6, 1),
+                "pid": pid,
+                "tid": s.thread,
+                "args": s.args,
+            }
+            for s in recorded
+        ],
+        "displayTimeUnit": "ms",
+    }
+
+
+def _report():
+    from rich.console import Console
+    from rich.table import Table
+
+    recorded = sorted(_spans, key=lambda s: s.start)
+    wall = time.perf_counter() - PROCESS_START
+    table = Table(title=f"Profile ({wall * 1000:.1f} ms wall)", title_justify="left")
+    table.add_column("Stage")
+    table.add_column("Start ms", justify="right")
+    table.add_column("Duration ms", justify="right")
+    table.add_column("% wall", justify="right")
+    for s in recorded:
+        duration = s.end - s.start
+        table.add_row(
+            "  " * s.depth + s.name,
+            f"{(s.start - PROCESS_START) * 1000:.1f}",
+            f"{duration * 1000:.1f}",
+            f"{duration / wall * 100:.0f}%" if wall else "",
+        )
+    console = Console(stderr=True)
+    console.print(table)
+
+    if _trace_path:
+        with open(_trace_path, "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(recorded), f)
+        console.print(f"[dim]Trace written to {_trace_path}[/dim]")
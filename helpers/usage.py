@@ -0,0 +1,346 @@
+import atexit
+import json
+import logging
+import math
+import queue
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from .chat_history import estimate_tokens
+from .config import get_config, DEFAULT_CONFIG
+
+LEDGER_PATH = Path.home() / ".ai_shell_usage.db"
+# Latency histogram buckets are 5% apart, so percentiles read from them are within ~5%
+BUCKET_GROWTH = 1.05
+# Per-call rows older than this are pruned; the rollups are kept
+RETENTION_DAYS = 90
+# Rollup periods in seconds: hourly for the edge of a window, daily for the rest
+HOUR, DAY = 3600, 86400
+
+# Tries at writing a batch while other processes hold the ledger's write lock
+WRITE_ATTEMPTS = 3
+
+# Where a result came from
+MODEL, CACHE, TEMPLATE = "model", "cache", "template"
+
+logger = logging.getLogger(__name__)
+
+
+class Usage(NamedTuple):
+    ts: float
+    operation: str  # script, explanation, revision, chat, summary
+    provider: str
+    model: str
+    source: str
+    ttft_ms: Optional[int]
+    latency_ms: int
+    prompt_tokens: int
+    response_tokens: int
+    error: bool
+
+
+class UsageSummary(NamedTuple):
+    group: str
+    calls: int
+    model_calls: int
+    cache_hits: int
+    template_hits: int
+    errors: int
+    prompt_tokens: int
+    response_tokens: int
+    latency: Dict[str, Optional[float]]
+    ttft: Dict[str, Optional[float]]
+
+
+def _bucket(ms: float) -> int:
+    return 0 if ms < 1 else int(math.log(ms, BUCKET_GROWTH)) + 1
+
+
+def _bucket_value(bucket: int) -> float:
+    """The middle of a bucket, in ms."""
+    return 0.0 if bucket == 0 else BUCKET_GROWTH ** (bucket - 0.5)
+
+
+def _merge(histogram: Dict[str, int], other: Dict[str, int]):
+    for bucket, count in other.items():
+        histogram[bucket] = histogram.get(bucket, 0) + count
+
+
+def percentiles(histogram: Dict[str, int], points=(50, 95, 99)) -> Dict[str, Optional[float]]:
+    total = sum(histogram.values())
+    result: Dict[str, Optional[float]] = {f"p{p}": None for p in points}
+    if not total:
+        return result
+    buckets = sorted((int(b), c) for b, c in histogram.items())
+    for p in points:
+        rank = math.ceil(total * p / 100)
+        seen = 0
+        for bucket, count in buckets:
+            seen += count
+            if seen >= rank:
+                result[f"p{p}"] = _bucket_value(bucket)
+                break
+    return result
+
+
+class UsageLedger:
+    """
+    An append-only SQLite log of model calls and cache/template answers, plus hourly
+    and daily rollups with latency histograms so `ai stats` never scans the per-call
+    rows: a window reads the hourly rollups up to its first midnight and the daily
+    ones after that.
+    Calls are queued and written by a background thread, off the hot path; the
+    queue is drained on exit.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._queue: "queue.Queue[Optional[Usage]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are begun explicitly, so a rollup update can take the write lock before reading
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS calls (
+                ts REAL NOT NULL,
+                operation TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                source TEXT NOT NULL,
+                ttft_ms INTEGER,
+                latency_ms INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                response_tokens INTEGER NOT NULL,
+                error INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS calls_ts ON calls (ts);
+            CREATE TABLE IF NOT EXISTS rollups (
+                period INTEGER NOT NULL,
+                start INTEGER NOT NULL,
+                operation TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                source TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                errors INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                response_tokens INTEGER NOT NULL,
+                latency_hist TEXT NOT NULL,
+                ttft_hist TEXT NOT NULL,
+                PRIMARY KEY (period, start, operation, provider, model, source)
+            );
+        """)
+        return conn
+
+    def record(self, usage: Usage):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        self._queue.put(usage)
+
+    def flush(self, timeout: float = 2.0):
+        """Writes whatever is queued and stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _run(self):
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM calls WHERE ts < ?", (time.time() - RETENTION_DAYS * 86400,))
+        except sqlite3.Error as error:
+            logger.warning("The usage ledger %s can't be opened, calls are not recorded: %s", self.path, error)
+            return
+        while True:
+            batch = [self._queue.get()]
+            # Whatever else is already queued goes into the same transaction
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = None in batch
+            self._write_batch(conn, [usage for usage in batch if usage is not None])
+            if done:
+                conn.close()
+                return
+
+    def _write_batch(self, conn: sqlite3.Connection, rows: List[Usage]):
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                self.write(conn, rows)
+                return
+            except sqlite3.OperationalError as error:
+                # Busy past the timeout: other processes are writing; the batch was rolled back, so try again
+                if attempt < WRITE_ATTEMPTS and "locked" in str(error):
+                    time.sleep(0.1 * attempt)
+                    continue
+                failure = error
+            except sqlite3.Error as error:
+                failure = error
+            logger.warning("%d calls were not recorded in the usage ledger: %s", len(rows), failure)
+            return
+
+    def write(self, conn: sqlite3.Connection, rows: List[Usage]):
+        if not rows:
+            return
+        rollups: Dict[tuple, list] = {}
+        for row in rows:
+            for period in (HOUR, DAY):
+                key = (period, int(row.ts // period) * period, row.operation, row.provider, row.model, row.source)
+                rollup = rollups.setdefault(key, [0, 0, 0, 0, {}, {}])
+                rollup[0] += 1
+                rollup[1] += int(row.error)
+                rollup[2] += row.prompt_tokens
+                rollup[3] += row.response_tokens
+                if row.source == MODEL and not row.error:
+                    _merge(rollup[4], {str(_bucket(row.latency_ms)): 1})
+                    if row.ttft_ms is not None:
+                        _merge(rollup[5], {str(_bucket(row.ttft_ms)): 1})
+
+        with conn:
+            # Taking the write lock first serializes the histogram read-modify-write across processes
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (r.ts, r.operation, r.provider, r.model, r.source, r.ttft_ms, r.latency_ms,
+                 r.prompt_tokens, r.response_tokens, int(r.error))
+                for r in rows
+            ])
+            for key, (calls, errors, prompt_tokens, response_tokens, latency, ttft) in rollups.items():
+                existing = conn.execute(
+                    "SELECT latency_hist, ttft_hist FROM rollups"
+                    " WHERE period = ? AND start = ? AND operation = ? AND provider = ? AND model = ? AND source = ?", key
+                ).fetchone()
+                if existing is not None:
+                    _merge(latency, json.loads(existing[0]))
+                    _merge(ttft, json.loads(existing[1]))
+                conn.execute(
+                    "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (period, start, operation, provider, model, source) DO UPDATE SET"
+                    " calls = calls + excluded.calls, errors = errors + excluded.errors,"
+                    " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+                    " response_tokens = response_tokens + excluded.response_tokens,"
+                    " latency_hist = excluded.latency_hist, ttft_hist = excluded.ttft_hist",
+                    (*key, calls, errors, prompt_tokens, response_tokens, json.dumps(latency), json.dumps(ttft)),
+                )
+
+    def summarize(self, since: float = 0.0, group_by: str = "operation") -> List[UsageSummary]:
+        """Totals and latency percentiles per `group_by` (operation, model, provider or day, in UTC), from the rollups."""
+        columns = {
+            "operation": "operation", "model": "model", "provider": "provider",
+            "day": "strftime('%Y-%m-%d', start, 'unixepoch')",
+        }
+        if not self.path.exists():
+            return []
+        first_hour = int(since // HOUR) * HOUR
+        first_day = -(-first_hour // DAY) * DAY
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT {columns[group_by]}, source, calls, errors, prompt_tokens, response_tokens, latency_hist, ttft_hist"
+                " FROM rollups WHERE (period = ? AND start >= ? AND start < ?) OR (period = ? AND start >= ?)",
+                (HOUR, first_hour, first_day, DAY, first_day),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        groups: Dict[str, dict] = {}
+        for group, source, calls, errors, prompt_tokens, response_tokens, latency, ttft in rows:
+            g = groups.setdefault(group, {"calls": 0, MODEL: 0, CACHE: 0, TEMPLATE: 0, "errors": 0,
+                                          "prompt_tokens": 0, "response_tokens": 0, "latency": {}, "ttft": {}})
+            g["calls"] += calls
+            g[source] = g.get(source, 0) + calls
+            g["errors"] += errors
+            g["prompt_tokens"] += prompt_tokens
+            g["response_tokens"] += response_tokens
+            _merge(g["latency"], json.loads(latency))
+            _merge(g["ttft"], json.loads(ttft))
+        return [
+            UsageSummary(
+                group, g["calls"], g[MODEL], g[CACHE], g[TEMPLATE], g["errors"], g["prompt_tokens"],
+                g["response_tokens"], percentiles(g["latency"]), percentiles(g["ttft"]),
+            )
+            for group, g in sorted(groups.items())
+        ]
+
+
+_ledger: Optional[UsageLedger] = None
+
+
+def get_usage_ledger() -> UsageLedger:
+    global _ledger
+    if _ledger is None:
+        _ledger = UsageLedger(LEDGER_PATH)
+    return _ledger
+
+
+def record_usage(
+    operation: str,
+    model: str,
+    source: str = MODEL,
+    prompt: str = "",
+    response: str = "",
+    latency: float = 0.0,
+    ttft: Optional[float] = None,
+    error: bool = False,
+    prompt_tokens: Optional[int] = None,
+):
+    """Queues one call for the ledger; `latency` and `ttft` are in seconds."""
+    config = get_config()
+    if str(config.get("USAGE_LEDGER", DEFAULT_CONFIG["USAGE_LEDGER"])).lower() != "true":
+        return
+    from .llm import get_provider
+
+    get_usage_ledger().record(Usage(
+        ts=time.time(),
+        operation=operation,
+        provider=get_provider(config),
+        model=model,
+        source=source,
+        ttft_ms=round(ttft * 1000) if ttft is not None else None,
+        latency_ms=round(latency * 1000),
+        prompt_tokens=estimate_tokens(prompt) if prompt_tokens is None else prompt_tokens,
+        response_tokens=estimate_tokens(response),
+        error=error,
+    ))
+
+
+def metered_stream(operation: str, model: str, prompt: str, stream: Iterable[str]) -> Iterator[str]:
+    """Passes a text stream through, recording its time to first chunk, total time and size."""
+    start = time.perf_counter()
+    ttft = None
+    chunks: List[str] = []
+    error = False
+    try:
+        for chunk in stream:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            chunks.append(chunk)
+            yield chunk
+    except Exception:
+        error = True
+        raise
+    finally:
+        record_usage(operation, model, MODEL, prompt, "".join(chunks), time.perf_counter() - start, ttft, error)
+
+
+def parse_window(window: str) -> float:
+    """The start time for a window like "24h", "7d" or "4w"; "all" means everything."""
+    if window == "all":
+        return 0.0
+    match = re.fullmatch(r"(\d+)([hdw])", window.strip())
+    if match is None:
+        raise ValueError(window)
+    seconds = {"h": 3600, "d": 86400, "w": 7 * 86400}[match.group(2)]
+    return time.time() - int(match.group(1)) * seconds
@@ -0,0 +1,41 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_batch(home: Path, *args: str) -> subprocess.CompletedProcess:
+    env = {
+        **os.environ,
+        "HOME": str(home),
+        "AI_SHELL_PROVIDER": "stub",
+        "AI_SHELL_STUB_LATENCY": "0.01",
+        "AI_SHELL_STUB_TOKENS_PER_SECOND": "0",
+        "AI_SHELL_INTENT_THRESHOLD": "0",
+        "AI_SHELL_USAGE_LEDGER": "false",
+    }
+    return subprocess.run(
+        [sys.executable, str(ROOT / "cli.py"), "batch", *args], env=env, capture_output=True, text=True, timeout=60
+    )
+
+
+def test_concurrent_workers_all_write_the_cache(tmp_path):
+    prompts = tmp_path / "prompts.txt"
+    prompts.write_text("".join(f"list files changed {i} days ago\n" for i in range(12)))
+
+    # Options after the file are accepted too
+    result = run_batch(tmp_path, str(prompts), "-c", "4")
+    assert result.returncode == 0, result.stderr
+    rows = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [row["prompt"] for row in rows] == prompts.read_text().splitlines()
+    assert all(row["error"] is None and row["command"] for row in rows)
+
+    conn = sqlite3.connect(tmp_path / ".ai_shell_cache.db")
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM responses WHERE kind = 'script'").fetchone()[0] == 12
+    finally:
+        conn.close()
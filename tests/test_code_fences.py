@@ -0,0 +1,62 @@
+import pytest
+
+from helpers.completion import CodeFenceStripper, strip_code_fences
+
+# Model replies seen in the wild, fenced and not
+CORPUS = [
+    "",
+    "   ",
+    "\n\n",
+    "ls -la",
+    "ls -la\n",
+    "  ls -la  \n\n",
+    "```bash\nls -la\n```",
+    "```bash\nls -la\n```\n",
+    "\n```sh\nfind . -name '*.js' -type f\n```\n\n",
+    "```\nls -la\n```",
+    "```zsh\nls -la | wc -l\n```",
+    "```powershell\nGet-ChildItem -Recurse -Filter *.js\n```",
+    "  ```bash\n  ls -la\n  ```  ",
+    "```bash\nls -la",
+    "ls -la\n```",
+    "```bash\n```",
+    "```\n\n```",
+    "for f in *.txt; do\n  echo \"$f\"\ndone",
+    "```bash\nfor f in *.txt; do\n  echo \"$f\"\ndone\n```",
+    "```bash\nls -la\n\n\nwc -l\n```",
+    "Here is the command:\n```bash\nls -la\n```\nIt lists files.",
+    "echo '``'",
+    "echo `date`",
+    "`ls`",
+    "``",
+    "`",
+    "``x",
+    " ``` ",
+    "```bash\necho '```'\n```",
+    "ls -la\r\n",
+    "```bash\r\nls -la\r\n```\r\n",
+    "a\n\n\n\nb",
+    "\tls\t\n\t```\t\n",
+    "ünïcödé → ls\n```\n",
+]
+
+
+def stream_stripped(text: str, size: int) -> str:
+    stripper = CodeFenceStripper()
+    out = [stripper.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    out.append(stripper.finish())
+    return "".join(out)
+
+
+@pytest.mark.parametrize("text", CORPUS)
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 5, 7, 16, 64, 10_000])
+def test_incremental_stripping_matches_whole_text(text, size):
+    assert stream_stripped(text, size) == strip_code_fences(text)
+
+
+@pytest.mark.parametrize("text", CORPUS)
+def test_every_split_point_matches(text):
+    for cut in range(len(text) + 1):
+        stripper = CodeFenceStripper()
+        out = stripper.feed(text[:cut]) + stripper.feed(text[cut:]) + stripper.finish()
+        assert out == strip_code_fences(text), cut
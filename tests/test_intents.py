@@ -0,0 +1,53 @@
+import pytest
+
+from helpers.intents import LIBRARY_PATH, IntentLibrary
+
+
+@pytest.fixture(scope="module")
+def library(tmp_path_factory):
+    return IntentLibrary([LIBRARY_PATH], tmp_path_factory.mktemp("intents") / "index")
+
+
+@pytest.mark.parametrize("prompt", [
+    "don't delete log files",
+    "do not delete log files",
+    "never delete log files",
+    "undo delete log files",
+    "delete log files except today's",
+    "delete only log files",
+    "delete log files now please",
+    "remove old log files",
+])
+def test_qualified_or_inexact_destructive_prompts_go_to_the_model(library, prompt):
+    assert library.match(prompt, "bash", 0.85) is None
+
+
+@pytest.mark.parametrize("prompt", [
+    "list files recursively",
+    "list hidden files recursively",
+    "please delete all the log files in this directory",
+    "delete log files here",
+    "list files in this directory recursively",
+])
+def test_scope_the_template_lacks_goes_to_the_model(library, prompt):
+    assert library.match(prompt, "bash", 0.5) is None
+
+
+@pytest.mark.parametrize("prompt, script", [
+    ("list files in this directory", "ls -la"),
+    ("list log files recursively", "find . -type f -name '*.log'"),
+])
+def test_scope_the_template_has_matches(library, prompt, script):
+    found = library.match(prompt, "bash", 0.85)
+    assert found is not None and found.script == script
+
+
+@pytest.mark.parametrize("prompt", ["delete log files", "please delete all the log files recursively"])
+def test_exact_destructive_prompts_match(library, prompt):
+    found = library.match(prompt, "bash", 0.85)
+    assert found is not None and found.script == "find . -type f -name '*.log' -delete"
+
+
+def test_extra_words_are_tolerated_for_harmless_templates(library):
+    found = library.match("list log files recursively now", "bash", 0.5)
+    assert found is not None and found.intent == "list-files-by-extension"
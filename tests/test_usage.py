@@ -0,0 +1,42 @@
+import json
+import multiprocessing
+import time
+
+from helpers.usage import MODEL, Usage, UsageLedger
+
+WRITERS = 4
+BATCHES = 25
+BATCH_SIZE = 4
+
+
+def _write(path, ts):
+    ledger = UsageLedger(path)
+    conn = ledger._connect()
+    rows = [Usage(ts, "script", "stub", "stub-model", MODEL, 100, 200, 10, 5, False)] * BATCH_SIZE
+    for _ in range(BATCHES):
+        ledger._write_batch(conn, rows)
+    conn.close()
+
+
+def test_concurrent_writers_add_up(tmp_path):
+    path = tmp_path / "usage.db"
+    ts = time.time()
+    UsageLedger(path)._connect().close()
+    workers = [multiprocessing.Process(target=_write, args=(path, ts)) for _ in range(WRITERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    calls = WRITERS * BATCHES * BATCH_SIZE
+    [summary] = UsageLedger(path).summarize(ts - 60)
+    assert (summary.calls, summary.model_calls, summary.prompt_tokens) == (calls, calls, 10 * calls)
+    assert summary.latency["p50"] is not None
+    conn = UsageLedger(path)._connect()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0] == calls
+        histograms = conn.execute("SELECT latency_hist FROM rollups").fetchall()
+    finally:
+        conn.close()
+    assert all(sum(json.loads(h).values()) == calls for (h,) in histograms)